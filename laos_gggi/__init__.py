@@ -8,6 +8,7 @@ from laos_gggi.data_functions import (
     load_hadcrut_data,
     load_shapefile,
     load_all_data,
+    load_panel_dataset,
     load_disaster_point_data,
     load_synthetic_non_disaster_points,
     load_rivers_data,
@@ -31,6 +32,7 @@ __all__ = [
     "load_hadcrut_data",
     "load_shapefile",
     "load_all_data",
+    "load_panel_dataset",
     "load_disaster_point_data",
     "load_rivers_data",
     "load_synthetic_non_disaster_points",
@@ -64,9 +64,17 @@ OCEAN_HEAT_FILENAME = "ncei_global_ocean_heat.csv"
 RIVERS_URL = "https://data.hydrosheds.org/file/HydroRIVERS/HydroRIVERS_v10_shp.zip"
 RIVERS_SHAPEFILE_FILENAME = "HydroRIVERS_v10.shp"
 RIVERS_ZIP_FILENAME = "rivers_zip_file.zip"
-BIG_RIVERS_FILENAME = "big_rivers.shp"
-RIVERS_HYDRO_DAMAGE_FILENAME = "rivers_hydro_damage.shp"
-RIVERS_FLOODS_DAMAGE_FILENAME = "rivers_floods_damage.shp"
+BIG_RIVERS_FILENAME = "big_rivers.parquet"
+RIVERS_HYDRO_DAMAGE_FILENAME = "rivers_hydro_damage.parquet"
+RIVERS_FLOODS_DAMAGE_FILENAME = "rivers_floods_damage.parquet"
+
+# Column names of point grids saved as shapefiles by earlier versions, which truncate names to 10 characters
+POINT_GRID_SHAPEFILE_RENAME = {
+    "distance_t": "distance_to_river",
+    "distance_1": "distance_to_coastline",
+    "log_distan": "log_distance_to_river",
+    "log_dist_1": "log_distance_to_coastline",
+}
 LAOS_LOCATION_DICTIONARY = {
     "1971-0048-LAO": {"Latitude": 17.9757, "Longitude": 102.6331},
     "2000-0583-LAO": {"Latitude": 19.0, "Longitude": 102.0},
@@ -2,28 +2,103 @@ from pyprojroot import here
 import os
 from os.path import exists
 from urllib.request import urlretrieve
+from laos_gggi.data_functions.session_cache import cached_loader
 from laos_gggi.const_vars import GPCC_YEARS, MAKE_GPCC_URL
-from laos_gggi.data_functions.shapefiles_data_loader import load_shapefile
-import geopandas as geo
+from laos_gggi.data_functions.country_weights import (
+    load_country_weights,
+    reduce_to_countries,
+)
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from laos_gggi.data_functions.gzip_cache import extract_gzip, enforce_cache_budget
 import pandas as pd
-import gzip
-import shutil
 import xarray as xr
 
 import logging
 
 _log = logging.getLogger(__name__)
 
+# Resampling frequency of each temporal resolution. Seasons are DJF, MAM, JJA, SON, labeled by their first month.
+GPCC_RESOLUTIONS = {"monthly": None, "seasonal": "QS-DEC", "annual": "YS"}
 
-def load_gpcc_data(output_path="data", force_reload=False, repair_ISO_codes=True):
-    def path_to_GPCC(years: str, extracted=False):
-        fname = f"gpcc_raw_{years}.nc"
-        fname += ".gz" if not extracted else ""
-        return os.path.join(output_path, "gpcc", fname)
+# Default size budget of the extracted NetCDF files, a bit more than one decade file
+GPCC_EXTRACTED_BYTES = 512 * 1024**2
+
+
+def _gpcc_country_means(precip, weights, countries):
+    return (
+        reduce_to_countries(precip, weights, countries)
+        .rename(ISO="country_code")
+        .to_series()
+        .dropna()
+        .reorder_levels(["country_code", "time"])
+        .to_frame("precip")
+    )
+
+
+def _process_gpcc_file(gz_path, cache_dir, weights, countries, freq=None):
+    with xr.open_dataset(extract_gzip(gz_path, cache_dir)) as data:
+        precip = data["precip"]
+        if freq is not None:
+            # Precipitation totals are summed per cell before any spatial work, so the country reduction
+            # only sees one slice per period
+            precip = precip.resample(time=freq).sum(min_count=1)
+        return _gpcc_country_means(precip, weights, countries)
+
+
+@cached_loader
+def load_gpcc_data(
+    output_path="data",
+    force_reload=False,
+    repair_ISO_codes=True,
+    n_cores=-1,
+    max_extracted_bytes=GPCC_EXTRACTED_BYTES,
+    resolution="monthly",
+):
+    """
+    Load GPCC monthly precipitation, aggregated to country means.
+
+    Parameters
+    ----------
+    output_path: str
+        Folder holding the raw and processed data
+    force_reload: bool, default False
+        If True, recompute the processed data even if it exists
+    repair_ISO_codes: bool, default True
+        Passed to ``load_shapefile`` when the country mask is built
+    n_cores: int, default -1
+        Number of worker processes used to process the decade files. -1 uses one per file, up to the number of
+        available cores.
+    max_extracted_bytes: int, optional
+        Size budget for the extracted NetCDF files kept in ``gpcc/extracted``, 512 MiB by default. Least recently
+        used files are evicted beyond it. If None, every extracted file is kept.
+    resolution: str, default "monthly"
+        Temporal resolution of the result: "monthly", "seasonal" (DJF, MAM, JJA, SON) or "annual". Monthly
+        totals are summed to the requested resolution cell by cell, before the country means are computed.
+        Each resolution has its own processed cache.
+
+    Returns
+    -------
+    pd.DataFrame
+        Frame indexed by (country_code, time), with a ``precip`` column
+    """
+
+    def path_to_GPCC(years: str):
+        return os.path.join(output_path, "gpcc", f"gpcc_raw_{years}.nc.gz")
+
+    if resolution not in GPCC_RESOLUTIONS:
+        raise ValueError(
+            f"resolution should be one of {list(GPCC_RESOLUTIONS)}, got {resolution}"
+        )
 
     output_path = here(output_path)
-    path_to_GPCC_unzipped = os.path.join(output_path, "gpcc/gpcc_raw_1981_1990.nc")
-    gpcc_processed_path = os.path.join(output_path, "gpcc/gpcc_precipitations.csv")
+    extracted_path = os.path.join(output_path, "gpcc", "extracted")
+    processed_fname = (
+        "gpcc_precipitations.csv"
+        if resolution == "monthly"
+        else f"gpcc_precipitations_{resolution}.csv"
+    )
+    gpcc_processed_path = os.path.join(output_path, "gpcc", processed_fname)
 
     # Check if "data" folder exists
     if not exists(output_path):
@@ -34,74 +109,60 @@ def load_gpcc_data(output_path="data", force_reload=False, repair_ISO_codes=True
     if not exists(gpcc_path):
         os.makedirs(gpcc_path)
 
+    # Extractions written next to the archives by older versions are not checked for integrity; they are removed
+    # and the archives are extracted again into the managed cache when needed
+    for year_range in GPCC_YEARS:
+        legacy_path = path_to_GPCC(year_range)[:-3]
+        if exists(legacy_path):
+            _log.info(f"Removing legacy extracted file {legacy_path}")
+            os.remove(legacy_path)
+
     # Check if the GPCC raw data exists
     for year_range in GPCC_YEARS:
         if not exists(path_to_GPCC(year_range)):
             _log.info(f'Downloading GPCC data for {" - ".join(year_range.split("_"))}')
-            urlretrieve(
-                MAKE_GPCC_URL(year_range), path_to_GPCC(year_range, extracted=False)
-            )
-
-    # Verify if the gpcc files are extracted (Note:gzip.open does not support loops)
-    if not exists(path_to_GPCC_unzipped):
-        for year_range in GPCC_YEARS:
-            with gzip.open(path_to_GPCC(year_range, extracted=False), "rb") as f_in:
-                with open(path_to_GPCC(year_range, extracted=True), "wb") as f_out:
-                    _log.info(
-                        f'Extracting GPCC data for {" - ".join(year_range.split("_"))}'
-                    )
-                    shutil.copyfileobj(f_in, f_out)
+            urlretrieve(MAKE_GPCC_URL(year_range), path_to_GPCC(year_range))
 
     if not exists(gpcc_processed_path) or force_reload:
-        # Import the world shapefile
-        _log.info("Loading world shapefile as GeoDataFrame")
-        world_shapefile = load_shapefile(
-            "world", force_reload=force_reload, repair_ISO_codes=repair_ISO_codes
-        ).rename(
-            columns={
-                "ISO_A3": "country_code",
-                "FORMAL_EN": "country",
-                "CONTINENT": "continent",
-                "REGION_UN": "region",
-            }
-        )
+        # Archives are extracted on demand into a managed cache; see gzip_cache.extract_gzip.
+        # All decade files share the same 0.5 degree grid, so the cell to country weights are loaded once
+        first_file = extract_gzip(path_to_GPCC(GPCC_YEARS[0]), extracted_path)
+        with xr.open_dataset(first_file) as data:
+            weights, countries = load_country_weights(
+                data["lat"].values,
+                data["lon"].values,
+                force_reload=force_reload,
+                repair_ISO_codes=repair_ISO_codes,
+            )
 
-        # Open gpcc files, transform them to geopandas shapefile geometry and merge them with the world shapefiles
-        result_df = pd.DataFrame()
-        for year_range in list(GPCC_YEARS):
-            str_range = " - ".join(year_range.split("_"))
+        if n_cores < 0:
+            n_cores = os.cpu_count() or 1
+        n_cores = max(1, min(n_cores, len(GPCC_YEARS)))
 
-            data = xr.open_dataset(path_to_GPCC(year_range, extracted=True))
-            df = data["precip"].to_dataframe().reset_index()
-            _log.info(
-                f"Merging {str_range} GPCC data with world shapefile using Lat/Lon (EPSG:4326 coordinates)"
+        # Each decade is extracted, opened and reduced in its own worker; only the compact country means
+        # come back
+        _log.info(f"Aggregating GPCC data to country means using {n_cores} processes")
+        with ProcessPoolExecutor(n_cores) as pool:
+            result = pool.map(
+                _process_gpcc_file,
+                [path_to_GPCC(year_range) for year_range in GPCC_YEARS],
+                repeat(extracted_path),
+                repeat(weights),
+                repeat(countries),
+                repeat(GPCC_RESOLUTIONS[resolution]),
             )
-            df_geo = geo.GeoDataFrame(
-                df, geometry=geo.points_from_xy(df["lon"], df["lat"]), crs="EPSG:4326"
-            )
-            df_geo_wshape = df_geo.sjoin(
-                world_shapefile, how="inner", predicate="intersects"
-            )[
-                [
-                    "time",
-                    "lat",
-                    "lon",
-                    "precip",
-                    "country_code",
-                    "geometry",
-                    "country",
-                    "continent",
-                    "region",
-                ]
-            ]
-            result_df = pd.concat([result_df, df_geo_wshape], axis=0)
-
-        result_df = result_df.pivot_table(
-            values="precip", index=["country_code", "time"], aggfunc="mean"
-        )
+            result_df = pd.concat(list(result))
+
+        # A DJF season straddles two decade files, so its two partial totals are added back together
+        if resolution != "monthly":
+            result_df = result_df.groupby(level=["country_code", "time"]).sum()
+        result_df = result_df.sort_index()
+
         _log.info(f"Saving processed GPCC data to {gpcc_processed_path}")
         result_df.to_csv(gpcc_processed_path)
     else:
         result_df = pd.read_csv(gpcc_processed_path).set_index(["country_code", "time"])
 
+    enforce_cache_budget(extracted_path, max_bytes=max_extracted_bytes)
+
     return result_df
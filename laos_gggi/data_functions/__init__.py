@@ -1,3 +1,4 @@
+from laos_gggi.data_functions.session_cache import session_cache
 from laos_gggi.data_functions.emdat_processing import load_emdat_data
 from laos_gggi.data_functions.world_bank_data_loader import load_wb_data
 from laos_gggi.data_functions.GPCC_data_loader import load_gpcc_data
@@ -5,6 +6,7 @@ from laos_gggi.data_functions.co2_processing import load_co2_data
 from laos_gggi.data_functions.ocean_heat_processing import load_ocean_heat_data
 from laos_gggi.data_functions.hadcrut_data_loader import load_hadcrut_data
 from laos_gggi.data_functions.combine_data import load_all_data
+from laos_gggi.data_functions.panel_dataset import load_panel_dataset
 from laos_gggi.data_functions.shapefiles_data_loader import load_shapefile
 from laos_gggi.data_functions.rivers_data_loader import load_rivers_data
 from laos_gggi.data_functions.disaster_point_data import (
@@ -21,7 +23,9 @@ __all__ = [
     "load_hadcrut_data",
     "load_shapefile",
     "load_all_data",
+    "load_panel_dataset",
     "load_rivers_data",
     "load_disaster_point_data",
     "load_synthetic_non_disaster_points",
+    "session_cache",
 ]
@@ -0,0 +1,96 @@
+import os
+from os.path import exists
+import logging
+
+import geopandas as gpd
+import pandas as pd
+
+_log = logging.getLogger(__name__)
+
+
+def _legacy_shapefile_path(fpath):
+    return os.path.splitext(fpath)[0] + ".shp"
+
+
+def select_columns(df, columns):
+    """
+    Restrict a frame to ``columns``, if given, mirroring the column projection of ``read_geo_artifact``.
+    """
+    if columns is None:
+        return df
+    return df[list(columns)]
+
+
+def geo_artifact_exists(fpath, legacy_path=None):
+    """
+    Check whether a derived geospatial artifact is available, either as GeoParquet or as a legacy shapefile.
+    """
+    if legacy_path is None:
+        legacy_path = _legacy_shapefile_path(fpath)
+    return exists(fpath) or exists(legacy_path)
+
+
+def write_geo_artifact(gdf, fpath):
+    """
+    Save a derived GeoDataFrame as GeoParquet.
+
+    Parameters
+    ----------
+    gdf: GeoDataFrame
+        Data to save. Column names are stored as-is, without the 10 character limit of shapefiles.
+    fpath: str
+        Path to the .parquet file
+    """
+    folder = os.path.dirname(fpath)
+    if folder and not exists(folder):
+        os.makedirs(folder)
+
+    gdf.to_parquet(fpath)
+
+
+def read_geo_artifact(
+    fpath, columns=None, legacy_path=None, legacy_rename=None, filters=None
+):
+    """
+    Load a derived geospatial artifact stored as GeoParquet, reading only the requested columns.
+
+    If the GeoParquet file does not exist yet but an ESRI shapefile from an earlier version of the pipeline
+    does, the shapefile is read once, its truncated column names are repaired, and it is migrated to
+    ``fpath``, then read back like any other artifact.
+
+    Parameters
+    ----------
+    fpath: str
+        Path to the .parquet file
+    columns: list of str, optional
+        Columns to read. If "geometry" is not among them, a plain DataFrame is returned.
+    legacy_path: str, optional
+        Path to the shapefile written by earlier versions. Defaults to ``fpath`` with a .shp extension.
+    legacy_rename: dict, optional
+        Mapping from the truncated shapefile column names to the full column names
+    filters: list, optional
+        Row filters pushed down to the Parquet reader (see ``pd.read_parquet``)
+
+    Returns
+    -------
+    GeoDataFrame or DataFrame
+        The stored data
+    """
+    if not exists(fpath):
+        if legacy_path is None:
+            legacy_path = _legacy_shapefile_path(fpath)
+        if not exists(legacy_path):
+            raise FileNotFoundError(f"No artifact found at {fpath} or {legacy_path}")
+
+        _log.info(f"Migrating {legacy_path} to GeoParquet at {fpath}")
+        gdf = gpd.read_file(legacy_path)
+        if legacy_rename is not None:
+            gdf = gdf.rename(columns=legacy_rename)
+        write_geo_artifact(gdf, fpath)
+
+    if columns is not None and "geometry" not in columns:
+        return pd.read_parquet(fpath, columns=list(columns), filters=filters)
+
+    return gpd.read_parquet(
+        fpath, columns=None if columns is None else list(columns), filters=filters
+    )
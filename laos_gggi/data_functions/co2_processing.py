@@ -2,9 +2,17 @@ from pyprojroot import here
 import pandas as pd
 import os
 from os.path import exists
+from laos_gggi.data_functions.session_cache import cached_loader
 from laos_gggi.const_vars import CO2_URL, CO2_FILENAME
 
 
+def _co2_sources(data_path=None):
+    return [
+        os.path.join(here("data") if data_path is None else data_path, CO2_FILENAME)
+    ]
+
+
+@cached_loader(sources=_co2_sources)
 def load_co2_data(data_path=None):
     if data_path is None:
         data_path = here("data")
@@ -1,164 +1,145 @@
 import pandas as pd
-from laos_gggi.data_functions.emdat_processing import load_emdat_data
+from laos_gggi.data_functions.emdat_processing import (
+    emdat_filters,
+    load_emdat_data,
+    load_emdat_raw,
+)
 from laos_gggi.data_functions.world_bank_data_loader import load_wb_data
 from laos_gggi.data_functions.GPCC_data_loader import load_gpcc_data
 from laos_gggi.data_functions.co2_processing import load_co2_data
 from laos_gggi.data_functions.ocean_heat_processing import load_ocean_heat_data
+from laos_gggi.data_functions.lazy_data import LazyDataDict
+from laos_gggi.data_functions.panel import (
+    build_panel,
+    build_time_series,
+    compact_frame,
+    filter_panel,
+    to_legacy_index,
+)
 from functools import partial, reduce
+from operator import itemgetter
 
 
-def load_all_data():
-    # Create the dictionary that contains the combined files
-    merged_dict = {}
+def _restrict_to_codes(df, codes):
+    return df.loc[lambda x: x.index.get_level_values(0).isin(codes)].copy()
 
-    # 1. EM-DAT data representing number of events per year (index: Year, ISO3)
-    emdat = load_emdat_data()
-    merged_dict["emdat_events"] = emdat["df_prob_filtered_adjusted"].drop(
-        columns=["Subregion"]
-    )
 
-    # 2. EM-DAT data representing the event damages (index: Year, ISO3)
-    merged_dict["emdat_damage"] = emdat["df_inten_filtered_adjusted"]
-    merged_dict["emdat_damage_hydro"] = emdat["df_inten_filtered_adjusted_hydro"]
-    merged_dict["emdat_damage_clim"] = emdat["df_inten_filtered_adjusted"]
+EMDAT_FRAMES = [
+    "df_prob_filtered_adjusted",
+    "df_inten_filtered_adjusted",
+    "df_inten_filtered_adjusted_hydro",
+    "df_inten_filtered_adjusted_clim",
+]
 
-    emdat["df_inten_filtered_adjusted_hydro"] = (
-        emdat["df_inten_filtered_adjusted_hydro"]
-        .drop(columns=["Region", "Subregion"])
-        .rename(columns=lambda x: f"{x}_hydro")
-    )
 
-    emdat["df_inten_filtered_adjusted_clim"] = (
-        emdat["df_inten_filtered_adjusted_clim"]
-        .drop(columns=["Region", "Subregion"])
-        .rename(columns=lambda x: f"{x}_clim")
-    )
+def _load_emdat(iso_list=None, region=None, years=None):
+    # All panels come from the same pass over the events, so build the ones used below together. A plain dict
+    # can be sent back from a worker process, unlike the lazy mapping.
+    emdat = load_emdat_data(iso_list=iso_list, region=region, years=years)
+    return {name: emdat[name] for name in EMDAT_FRAMES}
 
-    merged_dict["emdat_damage"] = pd.merge(
-        merged_dict["emdat_damage"],
-        emdat["df_inten_filtered_adjusted_hydro"],
-        left_index=True,
-        right_index=True,
-        how="left",
-    )
 
-    merged_dict["emdat_damage"] = pd.merge(
-        merged_dict["emdat_damage"],
-        emdat["df_inten_filtered_adjusted_clim"],
-        left_index=True,
-        right_index=True,
-        how="left",
-    )
+def _selected_codes(iso_list=None, region=None):
+    # ISO codes kept by the country filters, None to keep every country. Regions are EM-DAT regions, so their
+    # countries are looked up in the (filtered) EM-DAT cache.
+    if region is None:
+        return None if iso_list is None else set(iso_list)
 
-    merged_dict["df_inten_filtered_adjusted_hydro"] = emdat[
-        "df_inten_filtered_adjusted_hydro"
-    ]
-    merged_dict["df_inten_filtered_adjusted_clim"] = emdat[
-        "df_inten_filtered_adjusted_clim"
-    ]
+    events = load_emdat_raw(filters=emdat_filters(iso_list=iso_list, region=region))
+    return set(events["ISO"].astype(str))
 
-    # 3. The WB data, index (Year, ISO3)
-    merged_dict["wb_data"] = load_wb_data()
-    merged_dict["wb_data"] = (
-        merged_dict["wb_data"]
-        .reset_index()
+
+def _wb_panel(iso_codes=None, years=None):
+    wb_data = filter_panel(load_wb_data(), iso_codes=iso_codes, years=years)
+    return (
+        wb_data.reset_index()
         .rename(columns={"country_code": "ISO", "year": "Start_Year"})
         .assign(Start_Year=lambda x: pd.to_datetime(x.Start_Year, format="%Y"))
         .set_index(["ISO", "Start_Year"])
     )
-    # 4 A single dataframe containing all of the timeseries-only data: GPCC + NOAA + NECI, index: Year
-    # 4.1 GPCC: precipitation
-    gpcc = load_gpcc_data()
-    gpcc = gpcc.reset_index().rename(columns={"country_code": "ISO"})
-    gpcc["year"] = pd.to_datetime(pd.to_datetime(gpcc["time"]).dt.year, format="%Y")
-    merged_dict["gpcc"] = gpcc.pivot_table(
-        values="precip", index=["ISO", "year"], aggfunc="sum"
+
+
+def _common_codes(emdat, wb_panel):
+    # ISO reconciliation: drop codes that are not both in EM-DAT and in the World Bank data
+    emdat_iso = emdat["df_inten_filtered_adjusted"].index.get_level_values(0).unique()
+    world_iso = wb_panel.index.get_level_values(0).unique()
+
+    return set(world_iso).intersection(set(emdat_iso))
+
+
+def _emdat_events(emdat, common_codes):
+    # EM-DAT data representing number of events per year (index: Year, ISO3)
+    return _restrict_to_codes(
+        emdat["df_prob_filtered_adjusted"].drop(columns=["Subregion"]), common_codes
+    ).drop(columns=["Region"])
+
+
+def _suffixed_damage(emdat, disaster_class):
+    return (
+        emdat[f"df_inten_filtered_adjusted_{disaster_class}"]
+        .drop(columns=["Region", "Subregion"])
+        .rename(columns=lambda x: f"{x}_{disaster_class}")
     )
-    merged_dict["gpcc_agg"] = gpcc.pivot_table(
-        values="precip", index=["year"], aggfunc="sum"
+
+
+def _emdat_damage(emdat, damage_hydro, damage_clim, common_codes):
+    # EM-DAT data representing the event damages (index: Year, ISO3)
+    damage = reduce(
+        lambda left, right: pd.merge(
+            left, right, left_index=True, right_index=True, how="left"
+        ),
+        [emdat["df_inten_filtered_adjusted"], damage_hydro, damage_clim],
     )
+    return _restrict_to_codes(damage, common_codes)
+
+
+def _load_gpcc(iso_codes=None, years=None):
+    gpcc = load_gpcc_data(resolution="annual")
+    gpcc = gpcc.reset_index().rename(columns={"country_code": "ISO"})
+    gpcc["year"] = pd.to_datetime(pd.to_datetime(gpcc["time"]).dt.year, format="%Y")
+
+    if iso_codes is not None:
+        gpcc = gpcc.loc[gpcc["ISO"].isin(list(iso_codes))]
+    if years is not None:
+        gpcc = gpcc.loc[gpcc["year"].dt.year.between(*years)]
+
+    return gpcc
+
+
+def _gpcc_panel(gpcc, wb_data):
+    gpcc = gpcc.pivot_table(values="precip", index=["ISO", "year"], aggfunc="sum")
+
+    # ISO reconciliation: gpcc
+    wb_iso = wb_data.index.get_level_values(0).unique()
+    gpcc_iso = gpcc.index.get_level_values(0).unique()
+
+    return _restrict_to_codes(gpcc, set(wb_iso).intersection(set(gpcc_iso)))
+
 
-    # 4.2 NOAA: CO2
+def _gpcc_aggregate(gpcc):
+    return gpcc.pivot_table(values="precip", index=["year"], aggfunc="sum")
+
+
+def _co2_series(years=None):
+    # NOAA: CO2
     co2 = load_co2_data()
     co2.reset_index(inplace=True)
     co2["year"] = pd.to_datetime(co2["Date"].dt.year, format="%Y")
-    merged_dict["co2"] = co2.pivot_table(values="co2", index="year", aggfunc="sum")
+    co2 = co2.pivot_table(values="co2", index="year", aggfunc="sum")
+    return filter_panel(co2, years=years)
+
 
-    # 4.3 NECI: ocean temperature
+def _ocean_temperature_series(years=None):
+    # NECI: ocean temperature
     ocean_heat = load_ocean_heat_data()
     ocean_heat["year"] = ocean_heat.reset_index()["Date"].dt.year.values
     ocean_heat = ocean_heat.pivot_table(values="Temp", index="year", aggfunc="mean")
     ocean_heat.index = pd.to_datetime(ocean_heat.index, format="%Y")
-    merged_dict["ocean_temperature"] = ocean_heat
-
-    # 4.4 HACRUT: surface temperature
-    # surface_temp = load_hadcrut_data()
-
-    # merged_dict["surface_temp"] = surface_temp
-    # merged_dict["surface_temp_agg"] = surface_temp.reset_index().pivot_table(
-    #     values="surface_temperature_dev", index=["year"], aggfunc="mean"
-    # )
-
-    # ISO reconciliation: emdat and world
-    emdat_iso = merged_dict["emdat_damage"].index.get_level_values(0).unique()
-    world_iso = merged_dict["wb_data"].index.get_level_values(0).unique()
-    # Codes in EMDAT but not in world
-    ", ".join(list(set(emdat_iso) - set(world_iso)))
-    # Codes in shapefile but not in EMDAT
-    ", ".join(list(set(world_iso) - set(emdat_iso)))
-    # Drop codes not in both
-    common_codes = set(world_iso).intersection(set(emdat_iso))
-    merged_dict["emdat_damage"] = (
-        merged_dict["emdat_damage"]
-        .loc[lambda x: x.index.get_level_values(0).isin(common_codes)]
-        .copy()
-    )
+    return filter_panel(ocean_heat, years=years)
 
-    merged_dict["emdat_events"] = (
-        merged_dict["emdat_events"]
-        .loc[lambda x: x.index.get_level_values(0).isin(common_codes)]
-        .copy()
-        .drop(columns=["Region"])
-    )
-
-    merged_dict["wb_data"] = (
-        merged_dict["wb_data"]
-        .loc[merged_dict["wb_data"].index.get_level_values(0).isin(common_codes)]
-        .copy()
-    )
-
-    # ISO reconciliation: gpcc
-    merged_dict_iso = merged_dict["wb_data"].index.get_level_values(0).unique()
-    gpcc_iso = merged_dict["gpcc"].index.get_level_values(0).unique()
-
-    # Drop codes not in both
-    common_codes2 = set(merged_dict_iso).intersection(set(gpcc_iso))
-    merged_dict["emdat_damage"] = (
-        merged_dict["emdat_damage"]
-        .loc[lambda x: x.index.get_level_values(0).isin(common_codes)]
-        .copy()
-    )
 
-    merged_dict["gpcc"] = (
-        merged_dict["gpcc"]
-        .loc[lambda x: x.index.get_level_values(0).isin(common_codes2)]
-        .copy()
-    )
-    # ISO reconciliation: hadcrut
-    # merged_dict_iso = merged_dict["wb_data"].index.get_level_values(0).unique()
-    # # hadcrut_iso = merged_dict["surface_temp"].index.get_level_values(0).unique()
-    #
-    # # Drop codes not in both
-    # common_codes2 = set(merged_dict_iso).intersection(set(hadcrut_iso))
-    #
-    # merged_dict["surface_temp"] = (
-    #     merged_dict["surface_temp"]
-    #     .loc[lambda x: x.index.get_level_values(0).isin(common_codes2)]
-    #     .copy()
-    # )
-
-    # 5 Country constants
-    merged_dict["country_constants"] = (
+def _country_constants(emdat):
+    return (
         emdat["df_prob_filtered_adjusted"]
         .reset_index()
         .drop(
@@ -171,43 +152,129 @@ def load_all_data():
                 "Extreme temperature",
             ],
             axis=1,
+            errors="ignore",
         )
         .drop_duplicates()
         .set_index("ISO")
     )
 
-    # Merging panel data sets
-    merge_func = partial(pd.merge, left_index=True, right_index=True, how="outer")  # noqa
-    merged_dict["df_panel"] = reduce(
-        lambda left, right: merge_func(left, right),
+
+def _panel(emdat_events, emdat_damage, wb_data, gpcc):
+    panel = build_panel([emdat_events, emdat_damage, wb_data, gpcc])
+    return to_legacy_index(panel, time_name="Start_Year")
+
+
+def load_all_data(
+    max_workers=None,
+    executor="thread",
+    compact=False,
+    float32=False,
+    iso_list=None,
+    region=None,
+    years=None,
+):
+    """
+    Combine EM-DAT, World Bank, GPCC, CO2 and ocean temperature data into panel and time series frames.
+
+    By default nothing is loaded up front: every key is computed the first time it is read, together with the
+    keys it depends on, and only the sources it needs are loaded. For example, reading "co2" only loads the
+    NOAA CO2 data, while reading "df_panel" loads EM-DAT, the World Bank data and GPCC.
+
+    If ``max_workers`` is given, every key is computed immediately instead, loading the independent sources
+    concurrently. Time spent on each key is available in the ``timings`` attribute of the result.
+
+    Country, region and year filters are pushed down to the EM-DAT Parquet cache, so only the selected events
+    are read. The other sources are stored as CSV and are filtered right after reading, before anything is
+    built from them. Time series built from country data (``gpcc_agg``) then only cover the selected countries.
+
+    Parameters
+    ----------
+    max_workers: int, optional
+        Number of workers used to compute everything up front. If -1, use all available cores. If None, keys are
+        computed lazily, on first access.
+    executor: str, default "thread"
+        One of "thread" or "process". See ``LazyDataDict.compute``.
+    compact: bool, default False
+        If True, every frame is returned in compact form (see ``compact_frame``): panels are indexed by ("ISO"
+        categorical, "year" int16) and time series by "year" int16, with integer counts and categorical text
+        columns.
+    float32: bool, default False
+        If True and ``compact`` is True, measures (everything but the disaster counts) are stored as float32
+    iso_list: list of str, optional
+        Only keep these countries
+    region: str or list of str, optional
+        Only keep the countries of these EM-DAT regions or subregions (e.g. "Africa" or "South-eastern Asia")
+    years: tuple of int, optional
+        Only keep these years, both included
+
+    Returns
+    -------
+    LazyDataDict
+        Combined data. Panel frames are indexed by (ISO, Start_Year), time series frames by year.
+    """
+    data = LazyDataDict()
+
+    # Sources
+    data.add("_emdat", partial(_load_emdat, iso_list, region, years))
+    data.add("_iso_codes", partial(_selected_codes, iso_list, region))
+    data.add("_wb_data", partial(_wb_panel, years=years), ["_iso_codes"])
+    data.add("_gpcc", partial(_load_gpcc, years=years), ["_iso_codes"])
+    data.add("_common_codes", _common_codes, ["_emdat", "_wb_data"])
+
+    # 1. EM-DAT data representing number of events per year (index: Year, ISO3)
+    data.add("emdat_events", _emdat_events, ["_emdat", "_common_codes"])
+
+    # 2. EM-DAT data representing the event damages (index: Year, ISO3)
+    data.add(
+        "emdat_damage",
+        _emdat_damage,
         [
-            merged_dict["emdat_events"],
-            merged_dict["emdat_damage"],
-            merged_dict["wb_data"],
-            (
-                merged_dict["gpcc"]
-                .reset_index()
-                .rename(columns={"year": "Start_Year"})
-                .set_index(["ISO", "Start_Year"])
-            ),
-            # (
-            #     merged_dict["surface_temp"]
-            #     .reset_index()
-            #     .rename(columns={"year": "Start_Year"})
-            #     .set_index(["ISO", "Start_Year"])
-            # ),
+            "_emdat",
+            "df_inten_filtered_adjusted_hydro",
+            "df_inten_filtered_adjusted_clim",
+            "_common_codes",
         ],
     )
+    data.add(
+        "emdat_damage_hydro", itemgetter("df_inten_filtered_adjusted_hydro"), ["_emdat"]
+    )
+    data.add("emdat_damage_clim", itemgetter("df_inten_filtered_adjusted"), ["_emdat"])
+    data.add(
+        "df_inten_filtered_adjusted_hydro",
+        partial(_suffixed_damage, disaster_class="hydro"),
+        ["_emdat"],
+    )
+    data.add(
+        "df_inten_filtered_adjusted_clim",
+        partial(_suffixed_damage, disaster_class="clim"),
+        ["_emdat"],
+    )
 
-    # Merging time series
-    merged_dict["df_time_series"] = reduce(
-        lambda left, right: merge_func(left, right),
-        [
-            merged_dict["co2"],
-            merged_dict["ocean_temperature"],
-            merged_dict["gpcc_agg"],
-            # merged_dict["surface_temp_agg"],
-        ],
+    # 3. The WB data, index (Year, ISO3)
+    data.add("wb_data", _restrict_to_codes, ["_wb_data", "_common_codes"])
+
+    # 4. Timeseries-only data: GPCC + NOAA + NECI, index: Year
+    data.add("gpcc", _gpcc_panel, ["_gpcc", "wb_data"])
+    data.add("gpcc_agg", _gpcc_aggregate, ["_gpcc"])
+    data.add("co2", partial(_co2_series, years=years))
+    data.add("ocean_temperature", partial(_ocean_temperature_series, years=years))
+
+    # 5. Country constants
+    data.add("country_constants", _country_constants, ["_emdat"])
+
+    # Merged panel data and time series
+    data.add("df_panel", _panel, ["emdat_events", "emdat_damage", "wb_data", "gpcc"])
+    data.add(
+        "df_time_series", build_time_series, ["co2", "ocean_temperature", "gpcc_agg"]
     )
 
-    return merged_dict
+    if compact:
+        # The frames are built as usual under hidden keys, and converted on access
+        for key in list(data):
+            data.rename(key, f"_{key}_full")
+            data.add(key, partial(compact_frame, float32=float32), [f"_{key}_full"])
+
+    if max_workers is not None:
+        data.compute(max_workers=max_workers, executor=executor)
+
+    return data
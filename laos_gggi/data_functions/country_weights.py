@@ -0,0 +1,219 @@
+from pyprojroot import here
+import os
+from os.path import exists
+import hashlib
+import logging
+
+import geopandas as gpd
+import numpy as np
+import scipy.sparse as sp
+import xarray as xr
+from shapely import STRtree
+
+from laos_gggi.data_functions.shapefiles_data_loader import load_shapefile
+
+_log = logging.getLogger(__name__)
+
+
+def _grid_hash(lat, lon, area_weighted, repair_ISO_codes):
+    h = hashlib.md5()
+    h.update(np.ascontiguousarray(lat, dtype="float64").tobytes())
+    h.update(np.ascontiguousarray(lon, dtype="float64").tobytes())
+    h.update(repr((area_weighted, repair_ISO_codes)).encode())
+    return h.hexdigest()[:12]
+
+
+def compute_country_weights(lat, lon, world, iso_column="ISO_A3", area_weighted=False):
+    """
+    Assign the cells of a regular lat/lon grid to the countries whose polygon contains the cell center.
+
+    Parameters
+    ----------
+    lat: array
+        Cell center latitudes
+    lon: array
+        Cell center longitudes
+    world: GeoDataFrame
+        Country polygons, in EPSG:4326
+    iso_column: str, default "ISO_A3"
+        Column of ``world`` holding the country codes
+    area_weighted: bool, default False
+        If True, each cell is weighted by cos(latitude), proportional to its area. Otherwise every cell
+        counts the same.
+
+    Returns
+    -------
+    weights: scipy.sparse.csr_array
+        (n_lat * n_lon, n_countries) weight matrix. Rows follow the C-order ravel of a (lat, lon) array.
+    countries: np.ndarray
+        Country code of each column
+    """
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    lon_grid, lat_grid = np.meshgrid(lon, lat)
+    points = gpd.points_from_xy(lon_grid.ravel(), lat_grid.ravel())
+
+    tree = STRtree(np.asarray(world.geometry.values))
+    cell_idx, polygon_idx = tree.query(points, predicate="intersects")
+
+    countries, country_idx = np.unique(
+        world[iso_column].to_numpy()[polygon_idx], return_inverse=True
+    )
+
+    if area_weighted:
+        values = np.cos(np.deg2rad(lat_grid.ravel()[cell_idx]))
+    else:
+        values = np.ones(len(cell_idx))
+
+    weights = sp.csr_array(
+        (values, (cell_idx, country_idx)), shape=(len(points), len(countries))
+    )
+
+    return weights, countries
+
+
+def load_country_weights(
+    lat,
+    lon,
+    area_weighted=False,
+    output_path="data/country_weights",
+    force_reload=False,
+    repair_ISO_codes=True,
+):
+    """
+    Load the cell-to-country weight matrix of a lat/lon grid, computing and caching it on first use.
+
+    The matrix depends only on the grid definition, so it is computed once per grid and saved as a .npz file
+    keyed by a hash of the coordinates. The world shapefile is only loaded on a cache miss.
+
+    Parameters
+    ----------
+    lat: array
+        Cell center latitudes
+    lon: array
+        Cell center longitudes
+    area_weighted: bool, default False
+        If True, cells are weighted by cos(latitude). See ``compute_country_weights``.
+    output_path: str
+        Folder holding the cached matrices
+    force_reload: bool, default False
+        If True, recompute the matrix even if a cached copy exists
+    repair_ISO_codes: bool, default True
+        Passed to ``load_shapefile`` when the world shapefile is needed
+
+    Returns
+    -------
+    weights: scipy.sparse.csr_array
+        (n_lat * n_lon, n_countries) weight matrix
+    countries: np.ndarray
+        Country code of each column
+    """
+    output_path = here(output_path)
+    if not exists(output_path):
+        os.makedirs(output_path)
+
+    key = _grid_hash(lat, lon, area_weighted, repair_ISO_codes)
+    fpath = os.path.join(output_path, f"country_weights_{key}.npz")
+
+    if exists(fpath) and not force_reload:
+        with np.load(fpath, allow_pickle=False) as f:
+            weights = sp.csr_array(
+                (f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"])
+            )
+            countries = f["countries"]
+        return weights, countries
+
+    _log.info("Computing grid cell to country weights")
+    world = load_shapefile("world", repair_ISO_codes=repair_ISO_codes)
+    weights, countries = compute_country_weights(
+        lat, lon, world, area_weighted=area_weighted
+    )
+
+    np.savez(
+        fpath,
+        data=weights.data,
+        indices=weights.indices,
+        indptr=weights.indptr,
+        shape=np.array(weights.shape),
+        countries=countries.astype("U"),
+    )
+
+    return weights, countries
+
+
+def reduce_to_countries(
+    da,
+    weights,
+    countries,
+    lat_dim="lat",
+    lon_dim="lon",
+    chunk_dim=None,
+    chunk_size=None,
+):
+    """
+    Compute weighted country means of a gridded DataArray, skipping missing cells.
+
+    Every dimension other than ``lat_dim`` and ``lon_dim`` (time, realization, ...) is kept, and the whole
+    reduction is a single sparse matrix product. For lazily opened datasets, ``chunk_dim`` and ``chunk_size``
+    bound memory use: only ``chunk_size`` slices along ``chunk_dim`` are loaded at a time.
+
+    Parameters
+    ----------
+    da: xr.DataArray
+        Gridded data
+    weights: scipy.sparse.csr_array
+        (n_lat * n_lon, n_countries) matrix from ``load_country_weights``, built on the same grid as ``da``
+    countries: np.ndarray
+        Country code of each column of ``weights``
+    lat_dim: str, default "lat"
+        Name of the latitude dimension
+    lon_dim: str, default "lon"
+        Name of the longitude dimension
+    chunk_dim: str, optional
+        Dimension along which to load and reduce the data in blocks
+    chunk_size: int, optional
+        Number of slices along ``chunk_dim`` per block. Required if ``chunk_dim`` is given.
+
+    Returns
+    -------
+    xr.DataArray
+        Country means, with the spatial dimensions replaced by an "ISO" dimension. Countries with no valid
+        cell get NaN.
+    """
+    if chunk_dim is not None and chunk_dim in da.dims:
+        return xr.concat(
+            [
+                reduce_to_countries(
+                    da.isel({chunk_dim: slice(start, start + chunk_size)}),
+                    weights,
+                    countries,
+                    lat_dim=lat_dim,
+                    lon_dim=lon_dim,
+                )
+                for start in range(0, da.sizes[chunk_dim], chunk_size)
+            ],
+            dim=chunk_dim,
+        )
+
+    da = da.transpose(..., lat_dim, lon_dim)
+    other_dims = da.dims[:-2]
+    shape = da.shape[:-2]
+
+    values = da.values.reshape(-1, da.shape[-2] * da.shape[-1]).T
+    valid = np.isfinite(values)
+
+    total = weights.T @ np.where(valid, values, 0.0)
+    weight_sum = weights.T @ valid.astype(weights.dtype)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(weight_sum > 0, total / weight_sum, np.nan)
+
+    return xr.DataArray(
+        means.T.reshape(*shape, len(countries)),
+        dims=(*other_dims, "ISO"),
+        coords={
+            **{dim: da.coords[dim] for dim in other_dims if dim in da.coords},
+            "ISO": countries,
+        },
+        name=da.name,
+    )
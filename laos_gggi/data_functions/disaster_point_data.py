@@ -3,16 +3,41 @@ from pyprojroot import here
 import sys
 import logging
 
-from laos_gggi.data_functions.shapefiles_data_loader import load_shapefile
+from laos_gggi.data_functions.shapefiles_data_loader import (
+    RIVERS_BBOX_MARGIN,
+    RIVERS_MARGIN_METERS_PER_DEGREE,
+    load_shapefile,
+    load_projected_layer,
+    study_area_bbox,
+)
+from laos_gggi.data_functions.artifact_store import (
+    read_geo_artifact,
+    write_geo_artifact,
+    geo_artifact_exists,
+    select_columns,
+)
+from laos_gggi.data_functions.distance_rasters import load_distance_raster
+from laos_gggi.data_functions.grid_tiles import (
+    DEFAULT_TILE_SIZE,
+    build_grid_tiles,
+    grid_tiles_complete,
+    read_grid_tiles,
+)
+from laos_gggi.const_vars import POINT_GRID_SHAPEFILE_RENAME
 from laos_gggi.data_functions.emdat_processing import load_emdat_data
-from laos_gggi.data_functions.rivers_damage import load_rivers_data
-from laos_gggi.statistics import get_distance_to
+from laos_gggi.statistics import (
+    NearestFeatureIndex,
+    get_distance_to,
+    create_point_grid,
+)
 
 sys.path.insert(0, str(here()))
 
 import pandas as pd  # noqa
 import geopandas as gpd  # noqa
 import os  # noqa
+import shutil  # noqa
+import shapely  # noqa
 import numpy as np  # noqa
 
 _log = logging.getLogger(__name__)
@@ -63,7 +88,7 @@ def load_disaster_point_data():
     )
 
     if "distance_to_river" not in data.columns:
-        rivers = load_rivers_data()
+        rivers = load_projected_layer("rivers")
 
         distances = get_distance_to(
             rivers, points=data, return_columns=["ORD_FLOW", "HYRIV_ID"]
@@ -74,10 +99,10 @@ def load_disaster_point_data():
         modified_data = True
 
     if "distance_to_coastline" not in data.columns:
-        coastline = load_shapefile("coastline")
-        distances = get_distance_to(
-            coastline.boundary, points=data.loc[:, ["geometry"]]
-        ).rename(columns={"distance_to_closest": "distance_to_coastline"})
+        coastline = load_projected_layer("coastline")
+        distances = get_distance_to(coastline, points=data.loc[:, ["geometry"]]).rename(
+            columns={"distance_to_closest": "distance_to_coastline"}
+        )
         data = data.join(distances).assign(
             distance_to_coastline=lambda x: x.distance_to_coastline / 1000
         )
@@ -123,118 +148,312 @@ def load_grid_point_data(
     force_reload: bool = False,
     file_reg_name: str = None,
     altered_shape_file=None,
+    columns: list = None,
+    tile_size: int = None,
+    n_cores: int = -1,
+    resolution: float = None,
+    distance_resolution: float = None,
 ):
+    """
+    Load a grid of points over a region, with distances to the closest river and coastline.
+
+    Parameters
+    ----------
+    region: str, default "laos"
+        One of "laos", "sea" (South-East Asia) or "custom"
+    grid_size: int, default 400
+        Number of grid points along each axis, spread over the bounds of the region
+    iso_list: list of str, optional
+        Countries of a "custom" region
+    force_reload: bool, default False
+        If True, compute the grid again even if it was saved
+    file_reg_name: str, optional
+        Name under which a "custom" grid is saved
+    altered_shape_file: GeoDataFrame, optional
+        Shapes covered by the grid, in place of the countries of the region
+    columns: list of str, optional
+        Columns to return
+    tile_size: int, optional
+        If given, the grid is built tile by tile, and an interrupted run resumes from the finished tiles. See
+        ``build_grid_tiles``.
+    n_cores: int, default -1
+        Number of worker processes used to build tiles
+    resolution: float, optional
+        If given, the points are sliced from the global grid of this spacing, in degrees, instead of a grid
+        over the region (see ``load_global_grid_data``). ``grid_size`` and ``file_reg_name`` are then ignored.
+    distance_resolution: float, optional
+        If given, distances to the coastline are interpolated from a distance raster of the region with nodes
+        this many meters apart, within ``distance_resolution / sqrt(2)`` of the exact distances (see
+        ``load_distance_raster``). The river raster only bounds the search for the closest river, so river
+        distances, "ORD_FLOW" and "HYRIV_ID" stay exact. Rasters are saved and reused by every grid of the
+        region. Cannot be combined with ``tile_size`` or ``resolution``.
+
+    Returns
+    -------
+    GeoDataFrame
+        One row per grid point
+    """
     if region not in ["laos", "sea", "custom"]:
         raise ValueError(f"Unknown grid: {region}")
 
     if region == "custom" and iso_list is None:
         raise ValueError("Must provide an iso_list for custom region")
 
-    if (region == "custom") and file_reg_name is None:
+    if region == "custom" and file_reg_name is None and resolution is None:
         raise ValueError("Please provide a file_reg_name for the custom region")
 
+    if distance_resolution is not None and (
+        tile_size is not None or resolution is not None
+    ):
+        raise ValueError(
+            "distance_resolution cannot be combined with tile_size or resolution"
+        )
+
     if (region == "laos") or (region == "sea"):
         file_reg_name = region
 
-    fname = f"{file_reg_name}_points_{grid_size}.shp"
-    folder_path = here(os.path.join(DATA_FOLDER, "shapefiles", fname))
+    if region == "sea":
+        iso_list = [
+            "MMR",  # Myanmar
+            "THA",  # Thailand
+            "LAO",  # Laos
+            "KHM",  # Cambodia
+            "VNM",  # Vietnam
+            "IDN",  # Indonesia
+            "MYS",  # Malaysia
+            # "SGP",  # Singapore
+            "PHL",  # Philippines
+            # "BRN",  # Brunei
+            "TLS",  # Timor-Leste
+        ]
+    elif region == "laos":
+        iso_list = ["LAO"]  #  noqa
+
+    if resolution is not None:
+        return load_global_grid_data(
+            resolution,
+            iso_list=iso_list if altered_shape_file is None else None,
+            shape=altered_shape_file,
+            columns=columns,
+            tile_size=DEFAULT_TILE_SIZE if tile_size is None else tile_size,
+            n_cores=n_cores,
+            force_reload=force_reload,
+        )
 
-    if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
+    fname = f"{file_reg_name}_points_{grid_size}"
+    if distance_resolution is not None:
+        fname = f"{fname}_raster_{distance_resolution:g}"
+    fpath = here(os.path.join(DATA_FOLDER, "shapefiles", f"{fname}.parquet"))
 
-    fpath = os.path.join(folder_path, f"{fname}.shp")
+    # Earlier versions saved the grid as a shapefile, inside a folder of the same name
+    legacy_path = here(
+        os.path.join(DATA_FOLDER, "shapefiles", f"{fname}.shp", f"{fname}.shp.shp")
+    )
 
-    if os.path.exists(fpath) and not force_reload:
+    if geo_artifact_exists(fpath, legacy_path) and not force_reload:
         _log.info(f"Loading data found at {fpath}")
-        points = gpd.read_file(fpath)
-        points = points.rename(
-            columns={
-                "distance_t": "distance_to_river",
-                "distance_1": "distance_to_coastline",
-                "log_distan": "log_distance_to_river",
-                "log_dist_1": "log_distance_to_coastline",
-            }
+        points = read_geo_artifact(
+            fpath,
+            columns=columns,
+            legacy_path=legacy_path,
+            legacy_rename=POINT_GRID_SHAPEFILE_RENAME,
         )
 
-    elif not os.path.exists(fpath) or force_reload:
+    else:
         _log.info("Loading shapefiles and rivers data")
         world = load_shapefile("world")
 
-        if region == "sea":
-            iso_list = [
-                "MMR",  # Myanmar
-                "THA",  # Thailand
-                "LAO",  # Laos
-                "KHM",  # Cambodia
-                "VNM",  # Vietnam
-                "IDN",  # Indonesia
-                "MYS",  # Malaysia
-                # "SGP",  # Singapore
-                "PHL",  # Philippines
-                # "BRN",  # Brunei
-                "TLS",  # Timor-Leste
-            ]
-        elif region == "laos":
-            iso_list = ["LAO"]  #  noqa
-
         if altered_shape_file is None:
             point_map = world.query("ISO_A3 in @iso_list")
 
         else:
             point_map = altered_shape_file
 
-        rivers = load_rivers_data()
-        coastline = load_shapefile("coastline")
+        # Only the rivers around the region are read; see study_area_bbox
+        rivers = load_projected_layer("rivers", bbox=study_area_bbox(point_map))
+        coastline = load_projected_layer("coastline")
+
+        if tile_size is not None:
+            # Build the grid tile by tile; an interrupted run resumes from the tiles already written
+            tiles_path = here(os.path.join(DATA_FOLDER, "shapefiles", f"{fname}_tiles"))
+            build_grid_tiles(
+                point_map,
+                rivers,
+                coastline,
+                tiles_path,
+                grid_size=grid_size,
+                tile_size=tile_size,
+                n_cores=n_cores,
+                force_reload=force_reload,
+            )
+            points = read_grid_tiles(tiles_path).reset_index(drop=True)
 
-        _log.info("Computing point grid and features")
-        lon_min, lat_min, lon_max, lat_max = point_map.dissolve().bounds.values.ravel()
-        lon_grid = np.linspace(lon_min, lon_max, grid_size)
-        lat_grid = np.linspace(lat_min, lat_max, grid_size)
+        else:
+            _log.info("Computing point grid and features")
+            points = create_point_grid(point_map, grid_size=grid_size)
+
+            # Obtain distance with rivers
+            if distance_resolution is None:
+                distances_rivers = get_distance_to(
+                    rivers,
+                    points=points,
+                    return_columns=["ORD_FLOW", "HYRIV_ID"],
+                    name="rivers",
+                )
+            else:
+                distances_rivers = load_distance_raster(
+                    "rivers", point_map, file_reg_name, resolution=distance_resolution
+                ).lookup(
+                    points,
+                    index=NearestFeatureIndex(
+                        rivers, return_columns=["ORD_FLOW", "HYRIV_ID"]
+                    ),
+                )
+            distances_rivers = distances_rivers.rename(
+                columns={"distance_to_closest": "distance_to_river"}
+            )
 
-        grid = np.column_stack([x.ravel() for x in np.meshgrid(lon_grid, lat_grid)])
-        grid = gpd.GeoSeries(gpd.points_from_xy(*grid.T), crs="EPSG:4326")
-        grid = gpd.GeoDataFrame({"geometry": grid})
+            points = pd.merge(
+                points, distances_rivers, left_index=True, right_index=True, how="left"
+            )
 
-        points = grid.overlay(point_map, how="intersection").geometry
-        points = points.to_frame().assign(
-            lon=lambda x: x.geometry.x, lat=lambda x: x.geometry.y
-        )
+            # Obtain sea distance with coastlines
+            if distance_resolution is None:
+                distances_coastlines = get_distance_to(
+                    coastline, points=points, return_columns=None, name="coastline"
+                )
+            else:
+                distances_coastlines = load_distance_raster(
+                    "coastline",
+                    point_map,
+                    file_reg_name,
+                    resolution=distance_resolution,
+                ).lookup(points)
+            distances_coastlines = distances_coastlines.rename(
+                columns={"distance_to_closest": "distance_to_coastline"}
+            )
 
-        # Obtain distance with rivers
-        distances_rivers = get_distance_to(
-            rivers,
-            points=points,
-            return_columns=["ORD_FLOW", "HYRIV_ID"],
-            name="rivers",
-        ).rename(columns={"distance_to_closest": "distance_to_river"})
+            points = pd.merge(
+                points,
+                distances_coastlines,
+                left_index=True,
+                right_index=True,
+                how="left",
+            )
 
-        points = pd.merge(
-            points, distances_rivers, left_index=True, right_index=True, how="left"
-        )
+            # Assign is_island column
+            points["is_island"] = False
 
-        # Obtain sea distance with coastlines
-        distances_coastlines = get_distance_to(
-            coastline.boundary, points=points, return_columns=None, name="coastline"
-        ).rename(columns={"distance_to_closest": "distance_to_coastline"})
+            # Create log of distances
+            points = points.assign(
+                log_distance_to_river=lambda x: np.log(x.distance_to_river)
+            )
+            points = points.assign(
+                log_distance_to_coastline=lambda x: np.log(x.distance_to_coastline)
+            )
 
-        points = pd.merge(
-            points, distances_coastlines, left_index=True, right_index=True, how="left"
-        )
+        if (
+            points["distance_to_river"].max()
+            > RIVERS_BBOX_MARGIN * RIVERS_MARGIN_METERS_PER_DEGREE
+        ):
+            _log.warning(
+                "Some grid points are farther from a river than the margin of the river layer; their closest "
+                "river may lie outside the loaded area"
+            )
 
-        # Assign is_island column
-        points["is_island"] = False
+        write_geo_artifact(points, fpath)
+        if tile_size is not None:
+            shutil.rmtree(tiles_path)
+        points = select_columns(points, columns)
 
-        # Create log of distances
-        points = points.assign(
-            log_distance_to_river=lambda x: np.log(x.distance_to_river)
-        )
-        points = points.assign(
-            log_distance_to_coastline=lambda x: np.log(x.distance_to_coastline)
+    return points
+
+
+def load_global_grid_data(
+    resolution=0.1,
+    iso_list=None,
+    shape=None,
+    columns=None,
+    tile_size=DEFAULT_TILE_SIZE,
+    n_cores=-1,
+    force_reload=False,
+):
+    """
+    Load points of the global feature grid, with distances to the closest river and coastline.
+
+    The grid covers every country of the world shapefile, with one point at the center of each ``resolution``
+    x ``resolution`` degree cell. It is built once per resolution, tile by tile (see ``build_grid_tiles``), and
+    saved. Regions are then read as slices of the saved grid, selected by country or by shape, without
+    computing any distance again.
+
+    Parameters
+    ----------
+    resolution: float, default 0.1
+        Spacing of the grid, in degrees
+    iso_list: list of str, optional
+        Only return the points of these countries
+    shape: GeoDataFrame, optional
+        Only return the points on these shapes, in lon-lat coordinates
+    columns: list of str, optional
+        Columns to return
+    tile_size: int, default 256
+        Number of grid points along each side of a tile, when the grid is first built. A saved grid is read
+        whatever its tile size.
+    n_cores: int, default -1
+        Number of worker processes used to build the grid
+    force_reload: bool, default False
+        If True, build the whole grid again
+
+    Returns
+    -------
+    GeoDataFrame or DataFrame
+        Grid points indexed by "cell_id", their position in the global grid, with an "ISO" column
+    """
+    tiles_path = here(
+        os.path.join(DATA_FOLDER, "shapefiles", f"global_points_{resolution}")
+    )
+
+    if force_reload or not grid_tiles_complete(tiles_path):
+        _log.info(f"Building the global grid at {resolution} degrees")
+        build_grid_tiles(
+            load_shapefile("world"),
+            load_projected_layer("rivers"),
+            load_projected_layer("coastline"),
+            tiles_path,
+            tile_size=tile_size,
+            n_cores=n_cores,
+            force_reload=force_reload,
+            resolution=resolution,
         )
 
-        points.to_file(fpath)
+    filters = []
+    if iso_list is not None:
+        filters.append(("ISO", "in", list(iso_list)))
+    read_columns = columns
+    if shape is not None:
+        lon_min, lat_min, lon_max, lat_max = shape.total_bounds
+        filters += [
+            ("lon", ">=", lon_min),
+            ("lon", "<=", lon_max),
+            ("lat", ">=", lat_min),
+            ("lat", "<=", lat_max),
+        ]
+        if columns is not None:
+            read_columns = list(dict.fromkeys([*columns, "lon", "lat"]))
+
+    points = read_grid_tiles(tiles_path, columns=read_columns, filters=filters or None)
+
+    if shape is not None:
+        # Keep the points of the bounding box that fall on the shapes
+        region = shape.union_all()
+        shapely.prepare(region)
+        points = points.loc[
+            shapely.intersects_xy(
+                region, points["lon"].to_numpy(), points["lat"].to_numpy()
+            )
+        ]
 
-    return points
+    return select_columns(points, columns)
 
 
 def _sample_by_region(data, world, multiplier=1, rng=None):
@@ -321,8 +540,8 @@ def load_synthetic_non_disaster_points(
 
     if not os.path.exists(fpath) or force_generate:
         world = load_shapefile("world")
-        coastline = load_shapefile("coastline")
-        rivers = load_rivers_data()
+        coastline = load_projected_layer("coastline")
+        rivers = load_projected_layer("rivers")
 
         data = load_disaster_point_data().dropna(subset="Region")
 
@@ -360,7 +579,7 @@ def load_synthetic_non_disaster_points(
         )
 
         distances = get_distance_to(
-            coastline.boundary,
+            coastline,
             points=not_disasters,
             return_columns=None,
             name="coastline",
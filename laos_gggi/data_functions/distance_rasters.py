@@ -0,0 +1,143 @@
+from pyprojroot import here
+import os
+from os.path import exists
+import logging
+import shutil
+
+import numpy as np
+import xarray as xr
+
+from laos_gggi.data_functions.shapefiles_data_loader import (
+    load_projected_layer,
+    study_area_bbox,
+)
+from laos_gggi.statistics import DistanceRaster
+
+_log = logging.getLogger(__name__)
+
+RASTER_LAYERS = ["rivers", "coastline"]
+
+
+def raster_to_dataset(raster):
+    """
+    Convert a DistanceRaster to an xarray Dataset with dims ("y", "x").
+    """
+    n_y, n_x = raster.distances.shape
+    coords = {
+        "y": raster.y0 + raster.resolution * np.arange(n_y),
+        "x": raster.x0 + raster.resolution * np.arange(n_x),
+    }
+    return xr.Dataset(
+        {"distance": (("y", "x"), raster.distances)},
+        coords=coords,
+        attrs={
+            "x0": raster.x0,
+            "y0": raster.y0,
+            "resolution": raster.resolution,
+            "crs": raster.crs,
+        },
+    )
+
+
+def dataset_to_raster(ds):
+    """
+    Rebuild a DistanceRaster from the output of ``raster_to_dataset``.
+    """
+    return DistanceRaster(
+        ds["distance"].values,
+        ds.attrs["x0"],
+        ds.attrs["y0"],
+        ds.attrs["resolution"],
+        crs=ds.attrs["crs"],
+    )
+
+
+def _covers(raster, bounds):
+    x_min, y_min, x_max, y_max = raster.bounds
+    return (
+        x_min <= bounds[0]
+        and y_min <= bounds[1]
+        and x_max >= bounds[2]
+        and y_max >= bounds[3]
+    )
+
+
+def load_distance_raster(
+    which,
+    shapes,
+    name,
+    resolution=1000.0,
+    crs="EPSG:3395",
+    output_path="data/rasters",
+    force_reload=False,
+):
+    """
+    Load the raster of distances to the closest river or coastline over a region.
+
+    Distances are computed exactly at nodes spaced ``resolution`` apart (in units of ``crs``, meters by default)
+    over the bounds of ``shapes``, and saved as a Zarr store. Distances at any point of the region are then
+    interpolated bilinearly with ``DistanceRaster.lookup``, within ``resolution / sqrt(2)`` of the exact
+    distance, e.g. about 707 m at the default resolution of 1 km. Only distances are stored: attributes of the
+    closest river are found exactly by passing the river index to ``DistanceRaster.lookup``.
+
+    Parameters
+    ----------
+    which: str
+        One of "rivers" or "coastline". See ``load_projected_layer``.
+    shapes: GeoDataFrame
+        Shapes the raster should cover
+    name: str
+        Name of the region, used to save the raster. A saved raster that does not cover ``shapes`` is rebuilt.
+    resolution: float, default 1000
+        Spacing between nodes, in units of ``crs``
+    crs: str, default "EPSG:3395"
+        Projected CRS in which distances are computed
+    output_path: str, default "data/rasters"
+        Folder holding the saved rasters
+    force_reload: bool, default False
+        If True, compute the raster again even if it was saved
+
+    Returns
+    -------
+    DistanceRaster
+        The raster
+    """
+    if which not in RASTER_LAYERS:
+        raise ValueError(f"which should be one of {RASTER_LAYERS}, got {which}")
+
+    output_path = here(output_path)
+    fpath = os.path.join(output_path, f"{which}_{name}_{resolution:g}.zarr")
+    bounds = shapes.to_crs(crs).total_bounds
+
+    if exists(fpath) and not force_reload:
+        raster = dataset_to_raster(xr.open_zarr(fpath).load())
+        if (
+            raster.crs == crs
+            and raster.resolution == resolution
+            and _covers(raster, bounds)
+        ):
+            return raster
+        _log.info(f"The raster at {fpath} does not cover the region, rebuilding it")
+
+    raster = DistanceRaster.from_layer(
+        load_projected_layer(
+            which,
+            crs=crs,
+            bbox=study_area_bbox(shapes) if which == "rivers" else None,
+        ),
+        bounds,
+        resolution,
+        crs=crs,
+        desc=f"Computing distances to {which}",
+    )
+
+    # Write next to the final path and move into place, so an interrupted write never leaves a partial store
+    if not exists(output_path):
+        os.makedirs(output_path)
+    tmp_path = f"{fpath}.{os.getpid()}.partial"
+    raster_to_dataset(raster).to_zarr(tmp_path, mode="w")
+    if exists(fpath):
+        shutil.rmtree(fpath)
+    os.replace(tmp_path, fpath)
+
+    return raster
@@ -3,16 +3,148 @@ import numpy as np
 import pandas as pd
 import os
 from os.path import exists
+import hashlib
+from functools import partial
+import json
+import logging
 
+from laos_gggi.data_functions.session_cache import cached_loader
+from laos_gggi.data_functions.lazy_data import LazyDataDict
+from laos_gggi.data_functions.panel import compact_frame
 from laos_gggi.const_vars import (  # noqa
-    INTENSITY_COLS,
     EM_DAT_COL_DICT,
     PROB_COLS,
 )
 
+_log = logging.getLogger(__name__)
 
-def load_emdat_data(data_path="data", force_reload=False):
-    output_files = ["probability_data_set", "intensity_data_set"]  # noqa
+EMDAT_CATEGORICAL_COLS = ["ISO", "Region", "Disaster Type"]
+
+# The Parquet cache is sorted by country and year and split in small row groups, so that reads filtered on
+# countries, regions or years can skip most of the file
+EMDAT_ROW_GROUP_SIZE = 1024
+
+# First year of the (ISO, year) panels. They run to the last year found in the data.
+EMDAT_FIRST_YEAR = 1969
+
+
+def _cache_path(data_path, fname):
+    return os.path.join(here(data_path), fname)
+
+
+def _file_signature(fpath, with_hash=True):
+    stat = os.stat(fpath)
+    signature = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    if with_hash:
+        h = hashlib.sha256()
+        with open(fpath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        signature["sha256"] = h.hexdigest()
+
+    return signature
+
+
+def _is_cache_valid(emdat_path, signature_path):
+    if not exists(signature_path):
+        return False
+
+    with open(signature_path) as f:
+        cached = json.load(f)
+
+    # Cheap check first; only hash the workbook if it was touched since the cache was written
+    current = _file_signature(emdat_path, with_hash=False)
+    if all(cached.get(k) == v for k, v in current.items()):
+        return True
+
+    current = _file_signature(emdat_path)
+    if cached.get("sha256") != current["sha256"]:
+        return False
+
+    with open(signature_path, "w") as f:
+        json.dump(current, f)
+    return True
+
+
+def _make_parquet_safe(df):
+    # Excel columns mixing numbers and text (e.g. codes) can't be stored as a single Arrow type
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def emdat_filters(iso_list=None, region=None, years=None):
+    """
+    Build Parquet filters selecting EM-DAT events by country, region and year.
+
+    Parameters
+    ----------
+    iso_list: list of str, optional
+        ISO3 codes of the countries to keep
+    region: str or list of str, optional
+        EM-DAT regions or subregions to keep (e.g. "Africa", or "South-eastern Asia")
+    years: tuple of int, optional
+        First and last year to keep, both included
+
+    Returns
+    -------
+    list or None
+        Filters in the disjunctive normal form accepted by ``pd.read_parquet``, or None if no filter is given
+    """
+    # Values are passed as string indexes: an empty plain list has no type, and pyarrow cannot compare it with
+    # a string column
+    conjunction = []
+    if iso_list is not None:
+        conjunction.append(("ISO", "in", pd.Index(list(iso_list), dtype="string")))
+    if years is not None:
+        start, end = years
+        conjunction.append(
+            ("Start_Year", ">=", pd.Timestamp(year=start, month=1, day=1))
+        )
+        conjunction.append(("Start_Year", "<=", pd.Timestamp(year=end, month=1, day=1)))
+
+    if region is None:
+        return [conjunction] if conjunction else None
+
+    regions = pd.Index(
+        [region] if isinstance(region, str) else list(region), dtype="string"
+    )
+    return [
+        conjunction + [("Region", "in", regions)],
+        conjunction + [("Subregion", "in", regions)],
+    ]
+
+
+def _emdat_sources(data_path="data", **kwargs):
+    return [os.path.join(here(data_path), "emdat.xlsx")]
+
+
+@cached_loader(sources=_emdat_sources)
+def load_emdat_raw(data_path="data", force_reload=False, filters=None):
+    """
+    Load the raw EM-DAT event table, parsed, renamed and typed.
+
+    Parsing the Excel workbook is slow, so the parsed frame is cached next to it as Parquet, with ``ISO``,
+    ``Region`` and ``Disaster Type`` stored as categoricals. The cache is invalidated when the workbook
+    changes: its size and modification time are compared first, and its SHA-256 hash only if they differ.
+
+    Parameters
+    ----------
+    data_path: str
+        Folder holding ``emdat.xlsx``
+    force_reload: bool, default False
+        If True, parse the workbook even if a valid cache exists
+    filters: list, optional
+        Row filters pushed down to the Parquet reader, e.g. from ``emdat_filters``. Only the row groups that
+        can match are read.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per EM-DAT event, in workbook order
+    """
     data_path = here(data_path)
 
     if not exists(data_path):
@@ -25,139 +157,491 @@ def load_emdat_data(data_path="data", force_reload=False):
             "download the database, and place it in `/data/emdat.xlsx`"
         )
 
+    cache_path = os.path.join(data_path, "emdat_raw.parquet")
+    signature_path = os.path.join(data_path, "emdat_raw.json")
+
+    if (
+        exists(cache_path)
+        and not force_reload
+        and _is_cache_valid(emdat_path, signature_path)
+    ):
+        return pd.read_parquet(cache_path, filters=filters).sort_index()
+
+    _log.info(f"Parsing {emdat_path}")
     df_raw = (
-        pd.read_excel(os.path.join(data_path, "emdat.xlsx"), sheet_name="EM-DAT Data")
+        pd.read_excel(emdat_path, sheet_name="EM-DAT Data")
         .rename(columns=EM_DAT_COL_DICT)
         .assign(Start_Year=lambda x: pd.to_datetime(x.Start_Year, format="%Y"))
+        .astype({col: "category" for col in EMDAT_CATEGORICAL_COLS})
+    )
+    df_raw = _make_parquet_safe(df_raw)
+
+    _log.info(f"Caching parsed EM-DAT data to {cache_path}")
+    df_raw.sort_values(["ISO", "Start_Year"], kind="stable").to_parquet(
+        cache_path, row_group_size=EMDAT_ROW_GROUP_SIZE
+    )
+    with open(signature_path, "w") as f:
+        json.dump(_file_signature(emdat_path), f)
+
+    if filters is not None:
+        return pd.read_parquet(cache_path, filters=filters).sort_index()
+    return df_raw
+
+
+PROB_VARIANTS = ["unfiltered", "filtered", "filtered_adjusted"]
+INTENSITY_VARIANTS = PROB_VARIANTS + [
+    "filtered_adjusted_hydro",
+    "filtered_adjusted_clim",
+]
+DAMAGE_VARS = [
+    "Deaths",
+    "Homeless",
+    "Injured",
+    "Numb_Affected",
+    "Total_Affected",
+    "Total_Damage",
+    "Total_Damage_Adjusted",
+]
+DISASTER_CLASS_DICT = {
+    "Storm": "Hydrometereological",
+    "Flood": "Hydrometereological",
+    "Wildfire": "Climatological",
+    "Extreme temperature": "Climatological",
+    "Drought": "Climatological",
+}
+
+
+def _variant_masks(df):
+    year = df["Start_Year"].dt.year
+    adjusted = (df["Total_Affected"] > 1000) & (year > 1970)
+
+    return {
+        "unfiltered": pd.Series(True, index=df.index),
+        "filtered": adjusted & (df["Deaths"] > 100),
+        "filtered_adjusted": adjusted,
+        "filtered_adjusted_hydro": adjusted
+        & (df["disaster_class"] == "Hydrometereological"),
+        "filtered_adjusted_clim": adjusted & (df["disaster_class"] == "Climatological"),
+    }
+
+
+def _prob_column(variant, disaster_type):
+    return f"prob_{variant}|{disaster_type}"
+
+
+def _aggregate_columns(disaster_types):
+    return [
+        _prob_column(variant, name)
+        for variant in PROB_VARIANTS
+        for name in sorted(disaster_types)
+    ] + [
+        f"inten_{variant}|{var}"
+        for variant in INTENSITY_VARIANTS
+        for var in DAMAGE_VARS
+    ]
+
+
+def aggregate_emdat_variants(df_raw):
+    """
+    Aggregate EM-DAT events to (ISO, Start_Year) for every filter variant in a single grouped pass.
+
+    Each event is tagged with its membership in every variant. Event counts per disaster type and damage
+    totals are then spread into one column per (variant, variable), and the whole frame is summed in a single
+    groupby.
+
+    Parameters
+    ----------
+    df_raw: pd.DataFrame
+        Raw EM-DAT events, with a ``disaster_class`` column
+
+    Returns
+    -------
+    pd.DataFrame
+        Frame indexed by (ISO, Start_Year), with columns named "prob_{variant}|{Disaster Type}" (event counts)
+        and "inten_{variant}|{damage variable}" (damage totals). Only (ISO, year) pairs with at least one
+        event are included.
+    """
+    df = df_raw.loc[df_raw["Disaster Type"].isin(PROB_COLS)]
+    masks = _variant_masks(df)
+
+    # Events without a region were never counted (they were dropped as NaN group keys)
+    has_region = df[["Region", "Subregion"]].notna().all(axis=1)
+    disaster_type = df["Disaster Type"].astype(str)
+
+    columns = {}
+    for variant in PROB_VARIANTS:
+        counted = masks[variant] & has_region
+        for name in sorted(disaster_type.unique()):
+            columns[_prob_column(variant, name)] = counted & (disaster_type == name)
+
+    for variant in INTENSITY_VARIANTS:
+        for var in DAMAGE_VARS:
+            columns[f"inten_{variant}|{var}"] = df[var].where(masks[variant])
+
+    return (
+        pd.DataFrame(columns, index=df.index)
+        .groupby([df["ISO"].astype(str), df["Start_Year"]])
+        .sum()
+    )
+
+
+def make_emdat_panels(aggregated, complete_index, regions):
+    """
+    Split the output of ``aggregate_emdat_variants`` into one (ISO, Start_Year) panel per variant.
+
+    Parameters
+    ----------
+    aggregated: pd.DataFrame
+        Output of ``aggregate_emdat_variants``
+    complete_index: pd.MultiIndex
+        Every (ISO, Start_Year) pair the panels should cover. Missing pairs are filled with zeros.
+    regions: pd.DataFrame
+        Region and Subregion of every ISO code, indexed by ISO
+
+    Returns
+    -------
+    dict of str: pd.DataFrame
+        Panels keyed "df_prob_{variant}" and "df_inten_{variant}"
+    """
+    full = aggregated.reindex(complete_index).fillna(0).join(regions, on="ISO")
+
+    panels = {}
+    for variant in PROB_VARIANTS:
+        prefix = f"prob_{variant}|"
+        # Only disaster types that occur in the variant get a column
+        cols = [c for c in aggregated.columns if c.startswith(prefix) and full[c].any()]
+        panels[f"df_prob_{variant}"] = (
+            full[["Region", "Subregion"] + cols]
+            .rename(columns=lambda c: c.removeprefix(prefix))
+            .astype({c.removeprefix(prefix): "float64" for c in cols})
+            .rename_axis(columns="Disaster Type")
+        )
+
+    for variant in INTENSITY_VARIANTS:
+        prefix = f"inten_{variant}|"
+        cols = [prefix + var for var in DAMAGE_VARS]
+        panels[f"df_inten_{variant}"] = full[cols + ["Region", "Subregion"]].rename(
+            columns=lambda c: c.removeprefix(prefix)
+        )
+
+    return panels
+
+
+# Columns that determine the contribution of an event to ``aggregate_emdat_variants``
+EVENT_HASH_COLS = [
+    "ISO",
+    "Start_Year",
+    "Disaster Type",
+    "Region",
+    "Subregion",
+] + DAMAGE_VARS
+
+
+def _event_fingerprints(df_raw):
+    return pd.DataFrame(
+        {
+            "ISO": df_raw["ISO"].astype(str).to_numpy(),
+            "Start_Year": df_raw["Start_Year"].to_numpy(),
+            "hash": pd.util.hash_pandas_object(
+                df_raw[EVENT_HASH_COLS], index=False
+            ).to_numpy(),
+        },
+        index=pd.Index(df_raw["DisNo."].astype(str), name="DisNo."),
+    )
+
+
+def _changed_cells(old, new):
+    """
+    Find the (ISO, Start_Year) cells holding an event that was added, removed or modified between two sets of
+    event fingerprints. A modified event that moved to another country or year marks both cells.
+    """
+    common = old.index.intersection(new.index)
+    modified = common[
+        old.loc[common, "hash"].to_numpy() != new.loc[common, "hash"].to_numpy()
+    ]
+    old_events = old.index.difference(common).union(modified)
+    new_events = new.index.difference(common).union(modified)
+
+    cells = pd.concat(
+        [
+            old.loc[old_events, ["ISO", "Start_Year"]],
+            new.loc[new_events, ["ISO", "Start_Year"]],
+        ]
     )
+    return pd.MultiIndex.from_frame(cells).unique()
 
-    disaster_class_dict = {
-        "Storm": "Hydrometereological",
-        "Flood": "Hydrometereological",
-        "Wildfire": "Climatological",
-        "Extreme temperature": "Climatological",
-        "Drought": "Climatological",
+
+def _merge_aggregates(*aggregates):
+    disaster_types = {
+        col.split("|", 1)[1]
+        for agg in aggregates
+        for col in agg.columns
+        if col.startswith("prob_")
     }
+    columns = _aggregate_columns(disaster_types)
+    return pd.concat(
+        [agg.reindex(columns=columns, fill_value=0) for agg in aggregates]
+    ).sort_index()
+
+
+def update_emdat_aggregate(df_raw, data_path="data", force_reload=False):
+    """
+    Bring the aggregated EM-DAT table saved in ``data_path`` up to date with the raw events.
+
+    The output of ``aggregate_emdat_variants`` is saved as Parquet, together with a fingerprint of every event
+    (its ``DisNo.`` and a hash of the columns the aggregation uses). When the events change, the fingerprints
+    are compared by ``DisNo.``, and only the (ISO, Start_Year) cells holding an added, removed or modified event
+    are aggregated again. All other cells are read back from disk.
+
+    Parameters
+    ----------
+    df_raw: pd.DataFrame
+        Every raw EM-DAT event, with a ``disaster_class`` column
+    data_path: str
+        Folder holding the EM-DAT caches
+    force_reload: bool, default False
+        If True, aggregate every event again
+
+    Returns
+    -------
+    pd.DataFrame
+        The aggregated table, as returned by ``aggregate_emdat_variants``
+    """
+    aggregate_path = _cache_path(data_path, "emdat_aggregated.parquet")
+    events_path = _cache_path(data_path, "emdat_events.parquet")
+
+    events = _event_fingerprints(df_raw)
+    incremental = (
+        not force_reload
+        and exists(aggregate_path)
+        and exists(events_path)
+        and events.index.is_unique
+    )
+
+    if not incremental:
+        _log.info("Aggregating all EM-DAT events")
+        aggregated = aggregate_emdat_variants(df_raw)
+    else:
+        aggregated = pd.read_parquet(aggregate_path)
+        cells = _changed_cells(pd.read_parquet(events_path), events)
+        _log.info(f"Updating {len(cells)} EM-DAT (ISO, year) cells")
+
+        if len(cells) > 0:
+            in_cells = pd.MultiIndex.from_arrays(
+                [df_raw["ISO"].astype(str), df_raw["Start_Year"]]
+            ).isin(cells)
+            aggregated = _merge_aggregates(
+                aggregated.loc[~aggregated.index.isin(cells)],
+                aggregate_emdat_variants(df_raw.loc[in_cells]),
+            )
+
+    aggregated.to_parquet(aggregate_path, row_group_size=EMDAT_ROW_GROUP_SIZE)
+    events.to_parquet(events_path)
+    with open(_cache_path(data_path, "emdat_aggregated.json"), "w") as f:
+        json.dump({"sha256": _raw_cache_hash(data_path)}, f)
+
+    return aggregated
+
+
+def _raw_cache_hash(data_path):
+    with open(_cache_path(data_path, "emdat_raw.json")) as f:
+        return json.load(f)["sha256"]
+
+
+def _is_aggregate_current(data_path):
+    signature_path = _cache_path(data_path, "emdat_aggregated.json")
+    if not exists(signature_path) or not exists(
+        _cache_path(data_path, "emdat_aggregated.parquet")
+    ):
+        return False
+
+    with open(signature_path) as f:
+        return json.load(f)["sha256"] == _raw_cache_hash(data_path)
+
+
+def _load_aggregated(
+    df_raw, data_path="data", force_reload=False, filtered=False, years=None
+):
+    if force_reload or not _is_aggregate_current(data_path):
+        full_raw = _load_classified_emdat(data_path) if filtered else df_raw
+        aggregated = update_emdat_aggregate(
+            full_raw, data_path, force_reload=force_reload
+        )
+        if not filtered:
+            return aggregated
+
+    # Only read the cells of the countries and years that were loaded
+    filters = (
+        emdat_filters(df_raw["ISO"].astype(str).unique(), years=years)
+        if filtered
+        else None
+    )
+    return pd.read_parquet(
+        _cache_path(data_path, "emdat_aggregated.parquet"), filters=filters
+    )
+
 
-    df_raw["disaster_class"] = df_raw["Disaster Type"].map(disaster_class_dict.get)
+def _load_classified_emdat(data_path="data", force_reload=False, filters=None):
+    df_raw = load_emdat_raw(data_path, force_reload=force_reload, filters=filters)
+
+    df_raw["disaster_class"] = df_raw["Disaster Type"].map(DISASTER_CLASS_DICT.get)
 
     df_raw.loc[
         df_raw["Disaster Type"].isin(["Wildfire", "Extreme temperature", "Drought"]),
         "disaster_class",
     ] = "Climatological"
 
-    # Useful constants
-    region_dict = (
-        df_raw[["ISO", "Region"]].drop_duplicates().set_index("ISO").to_dict()["Region"]
-    )  #  noqa
-    subregion_dict = (
-        df_raw[["ISO", "Subregion"]]
-        .drop_duplicates()
+    return df_raw
+
+
+def _emdat_regions(df_raw):
+    return (
+        df_raw[["ISO", "Region", "Subregion"]]
+        .drop_duplicates("ISO", keep="last")
+        .astype({"ISO": str, "Region": object})
         .set_index("ISO")
-        .to_dict()["Subregion"]
-    )  #  noqa
-    years = pd.date_range(start="1969-01-01", end="2024-01-01", freq="YS-JAN")
-    ISO_codes = df_raw["ISO"].unique()
+    )
+
 
+def _last_emdat_year(df_raw, data_path="data", filtered=False):
+    # Panels of a filtered load run to the last year of the whole table, like unfiltered ones
+    if filtered:
+        df_raw = pd.read_parquet(
+            _cache_path(data_path, "emdat_raw.parquet"), columns=["Start_Year"]
+        )
+    return int(df_raw["Start_Year"].max().year)
+
+
+def _complete_emdat_index(df_raw, last_year, years=None):
     # Define the complete combination of years and ISO codes
-    complete_index = pd.MultiIndex.from_product(
+    start, end = EMDAT_FIRST_YEAR, last_year
+    if years is not None:
+        start, end = max(years[0], start), min(years[1], end)
+    years = pd.date_range(start=f"{start}-01-01", end=f"{end}-01-01", freq="YS-JAN")
+    ISO_codes = np.asarray(df_raw["ISO"].unique())
+
+    return pd.MultiIndex.from_product(
         [ISO_codes, years], names=["ISO", "Start_Year"]
     ).sort_values()
 
+
+def _select_variant(df_raw, variant):
+    return df_raw.loc[_variant_masks(df_raw)[variant]]
+
+
+def _get_panel(panels, name, compact=False, float32=False):
+    if compact:
+        return compact_frame(panels[name], float32=float32)
+    return panels[name]
+
+
+def load_emdat_data(
+    data_path="data",
+    force_reload=False,
+    compact=False,
+    float32=False,
+    iso_list=None,
+    region=None,
+    years=None,
+    incremental=True,
+):
+    """
+    Load the EM-DAT event tables and the (ISO, Start_Year) panels derived from them.
+
+    Nothing is loaded until a key is read: the workbook (or its Parquet cache) is only parsed when the first
+    key is requested, and each frame is built the first time it is read. All panels come from the same grouped
+    pass over the events, which runs once, when the first panel is read. Country, region and year filters are
+    pushed down to the Parquet cache of the workbook, so only the matching events are read.
+
+    The aggregated events are saved next to the workbook. When a new export of the workbook is dropped in, only
+    the (ISO, year) cells whose events changed are aggregated again (see ``update_emdat_aggregate``). Panels
+    cover every year from ``EMDAT_FIRST_YEAR`` to the last year in the workbook.
+
+    Parameters
+    ----------
+    data_path: str
+        Folder holding ``emdat.xlsx``
+    force_reload: bool, default False
+        If True, parse the workbook even if a valid cache exists
+    compact: bool, default False
+        If True, panels are indexed by ("ISO" categorical, "year" int16), with integer counts and categorical
+        regions. See ``compact_frame``. The raw event tables are not affected.
+    float32: bool, default False
+        If True and ``compact`` is True, damage columns are stored as float32
+    iso_list: list of str, optional
+        Only load events in these countries
+    region: str or list of str, optional
+        Only load events in these EM-DAT regions or subregions
+    years: tuple of int, optional
+        Only load events between these years, both included. Panels then only cover these years.
+    incremental: bool, default True
+        If True, keep the aggregated events on disk and only update the cells that changed. If False, aggregate
+        the loaded events in memory.
+
+    Returns
+    -------
+    LazyDataDict
+        Keys "df_raw", "df_raw_filtered", "df_raw_filtered_adj", "df_prob_{variant}" for each variant in
+        ``PROB_VARIANTS`` and "df_inten_{variant}" for each variant in ``INTENSITY_VARIANTS``
+    """
+    data = LazyDataDict()
+
     # Raw versions
-    df_raw_filtered = df_raw.query(
-        "Total_Affected >1000 &  Deaths >100 & Start_Year > 1970"
-    )
-    df_raw_filtered_adj = df_raw.query("Total_Affected >1000 & Start_Year > 1970")
-
-    def process_prob_df(df):
-        result = (
-            df.copy()
-            .query("`Disaster Type` in @PROB_COLS")
-            .groupby(["Disaster Type", "ISO", "Start_Year", "Region", "Subregion"])
-            .size()
-            .unstack("Disaster Type")
-            .reset_index()
-            .set_index(["ISO", "Start_Year"])
-            .sort_index()
-            .reindex(complete_index)
-            .assign(
-                Region=lambda x: x.index.get_level_values(0).map(region_dict.get),
-                Subregion=lambda x: x.index.get_level_values(0).map(subregion_dict.get),
-            )
-            .fillna(0)
-            .sort_index()
-        )
+    data.add(
+        "df_raw",
+        partial(
+            _load_classified_emdat,
+            data_path,
+            force_reload=force_reload,
+            filters=emdat_filters(iso_list, region, years),
+        ),
+    )
+    data.add(
+        "df_raw_filtered", partial(_select_variant, variant="filtered"), ["df_raw"]
+    )
+    data.add(
+        "df_raw_filtered_adj",
+        partial(_select_variant, variant="filtered_adjusted"),
+        ["df_raw"],
+    )
 
-        assert result.shape[0] == len(complete_index)
-        assert np.all(
-            result.index.get_level_values(0) == complete_index.get_level_values(0)
-        )
-        assert np.all(
-            result.index.get_level_values(1) == complete_index.get_level_values(1)
+    # Panels
+    data.add("_regions", _emdat_regions, ["df_raw"])
+    filtered = any(f is not None for f in (iso_list, region, years))
+    data.add(
+        "_last_year",
+        partial(_last_emdat_year, data_path=data_path, filtered=filtered),
+        ["df_raw"],
+    )
+    data.add(
+        "_complete_index",
+        partial(_complete_emdat_index, years=years),
+        ["df_raw", "_last_year"],
+    )
+    if incremental:
+        aggregate = partial(
+            _load_aggregated,
+            data_path=data_path,
+            force_reload=force_reload,
+            filtered=filtered,
+            years=years,
         )
-        return result
-
-    df_prob_unfiltered = process_prob_df(df_raw)
-    df_prob_filtered = process_prob_df(df_raw_filtered)
-    df_prob_filtered_adjusted = process_prob_df(df_raw_filtered_adj)
-
-    damage_vars = [
-        "Deaths",
-        "Injured",
-        "Numb_Affected",
-        "Homeless",
-        "Total_Affected",
-        "Total_Damage",
-        "Total_Damage_Adjusted",
-    ]
+    else:
+        aggregate = aggregate_emdat_variants
+    data.add("_aggregated", aggregate, ["df_raw"])
+    data.add(
+        "_panels",
+        make_emdat_panels,
+        ["_aggregated", "_complete_index", "_regions"],
+    )
 
-    def process_damage_df(df):
-        result = (
-            df.copy()
-            .query("`Disaster Type` in @PROB_COLS")[INTENSITY_COLS]
-            .pivot_table(index=["ISO", "Start_Year"], values=damage_vars, aggfunc="sum")
-            .sort_index()
-            .reindex(complete_index)
-            .assign(
-                Region=lambda x: x.index.get_level_values(0).map(region_dict.get),
-                Subregion=lambda x: x.index.get_level_values(0).map(subregion_dict.get),
-            )
-            .sort_index()
-            .fillna(0)
+    for name in [f"df_prob_{v}" for v in PROB_VARIANTS] + [
+        f"df_inten_{v}" for v in INTENSITY_VARIANTS
+    ]:
+        data.add(
+            name,
+            partial(_get_panel, name=name, compact=compact, float32=float32),
+            ["_panels"],
         )
-        assert result.shape[0] == len(complete_index)
-        assert np.all(
-            result.index.get_level_values(0) == complete_index.get_level_values(0)
-        )
-        assert np.all(
-            result.index.get_level_values(1) == complete_index.get_level_values(1)
-        )
-
-        return result
-
-    df_inten_unfiltered = process_damage_df(df_raw)
-    df_inten_filtered = process_damage_df(df_raw_filtered)
-    df_inten_filtered_adjusted = process_damage_df(df_raw_filtered_adj)
-    df_inten_filtered_adjusted_hydro = process_damage_df(
-        df_raw_filtered_adj.query('disaster_class == "Hydrometereological"')
-    )
-    df_inten_filtered_adjusted_clim = process_damage_df(
-        df_raw_filtered_adj.query('disaster_class == "Climatological"')
-    )
-
-    result = {
-        "df_raw": df_raw,
-        "df_raw_filtered": df_raw_filtered,
-        "df_raw_filtered_adj": df_raw_filtered_adj,
-        "df_prob_unfiltered": df_prob_unfiltered,
-        "df_prob_filtered": df_prob_filtered,
-        "df_prob_filtered_adjusted": df_prob_filtered_adjusted,
-        "df_inten_unfiltered": df_inten_unfiltered,
-        "df_inten_filtered": df_inten_filtered,
-        "df_inten_filtered_adjusted": df_inten_filtered_adjusted,
-        "df_inten_filtered_adjusted_hydro": df_inten_filtered_adjusted_hydro,
-        "df_inten_filtered_adjusted_clim": df_inten_filtered_adjusted_clim,
-    }
 
-    return result
+    return data
@@ -0,0 +1,322 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import logging
+import os
+from os.path import exists
+import shutil
+
+import numpy as np
+import pandas as pd
+import shapely
+from tqdm.notebook import tqdm
+
+from laos_gggi.data_functions.artifact_store import read_geo_artifact
+from laos_gggi.statistics import (
+    NearestFeatureIndex,
+    dissolve_regions,
+    points_in_regions,
+    grid_points_frame,
+)
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_TILE_SIZE = 256
+TILE_MANIFEST = "_grid.json"
+
+
+def grid_axes(bounds, grid_size):
+    """
+    Return the longitudes and latitudes of a ``grid_size`` x ``grid_size`` grid spread evenly over ``bounds``.
+    """
+    lon_min, lat_min, lon_max, lat_max = bounds
+    return np.linspace(lon_min, lon_max, grid_size), np.linspace(
+        lat_min, lat_max, grid_size
+    )
+
+
+def global_grid_axes(resolution):
+    """
+    Return the longitudes and latitudes of the global grid with a spacing of ``resolution`` degrees.
+
+    Grid points are the centers of the ``resolution`` x ``resolution`` cells covering the globe, so the grids of
+    all regions at the same resolution share their points.
+    """
+    n_lon, n_lat = round(360 / resolution), round(180 / resolution)
+    return (
+        -180 + resolution * (np.arange(n_lon) + 0.5),
+        -90 + resolution * (np.arange(n_lat) + 0.5),
+    )
+
+
+def grid_tiles(n_rows, n_cols, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Split a grid of ``n_rows`` x ``n_cols`` points into square tiles.
+
+    Returns
+    -------
+    list of tuple
+        (first row, last row + 1, first column, last column + 1) of every tile, rows first
+    """
+    return [
+        (r, min(r + tile_size, n_rows), c, min(c + tile_size, n_cols))
+        for r in range(0, n_rows, tile_size)
+        for c in range(0, n_cols, tile_size)
+    ]
+
+
+def _tile_path(output_path, tile):
+    return os.path.join(output_path, f"tile_{tile[0]:06d}_{tile[2]:06d}.parquet")
+
+
+_TILE_WORKER = None
+
+
+def _init_tile_worker(regions, rivers, coastline, crs):
+    global _TILE_WORKER
+    # Prepared geometries are not pickled; prepare them again in each worker
+    shapely.prepare(regions.values)
+    _TILE_WORKER = {
+        "regions": regions,
+        "rivers": NearestFeatureIndex(
+            rivers, return_columns=["ORD_FLOW", "HYRIV_ID"], crs=crs
+        ),
+        "coastline": NearestFeatureIndex(coastline, crs=crs),
+    }
+
+
+def _nearest(index, points):
+    geometries = np.asarray(points.geometry.to_crs(index.crs).values)
+    distances, feature_idx = index.query(geometries)
+    return index.make_frame(distances, feature_idx, points.index)
+
+
+def _build_tile(tile, lon_grid, lat_grid, fpath):
+    r0, r1, c0, c1 = tile
+    lat_idx, lon_idx, iso = points_in_regions(
+        _TILE_WORKER["regions"], lon_grid[c0:c1], lat_grid[r0:r1]
+    )
+    lat_idx, lon_idx = lat_idx + r0, lon_idx + c0
+
+    # Regions dissolved without a country column have no index name
+    has_iso = _TILE_WORKER["regions"].index.name is not None
+    points = grid_points_frame(
+        lon_grid[lon_idx], lat_grid[lat_idx], iso=iso if has_iso else None
+    )
+    points.index = pd.Index(lat_idx * len(lon_grid) + lon_idx, name="cell_id")
+
+    rivers = _nearest(_TILE_WORKER["rivers"], points).rename(
+        columns={"distance_to_closest": "distance_to_river"}
+    )
+    coastline = _nearest(_TILE_WORKER["coastline"], points).rename(
+        columns={"distance_to_closest": "distance_to_coastline"}
+    )
+    points = points.join(rivers).join(coastline)
+
+    points["is_island"] = False
+    points = points.assign(
+        log_distance_to_river=lambda x: np.log(x.distance_to_river),
+        log_distance_to_coastline=lambda x: np.log(x.distance_to_coastline),
+    )
+
+    # Write next to the final path and move into place, so a crash never leaves a partial tile behind
+    # (the leading underscore hides it from Parquet dataset readers)
+    folder, fname = os.path.split(fpath)
+    tmp_path = os.path.join(folder, f"_{fname}.{os.getpid()}.partial")
+    points.to_parquet(tmp_path)
+    os.replace(tmp_path, fpath)
+
+    return tile, len(points)
+
+
+def _grid_shape(manifest):
+    if "resolution" in manifest:
+        lon_grid, lat_grid = global_grid_axes(manifest["resolution"])
+        return len(lat_grid), len(lon_grid)
+    return manifest["grid_size"], manifest["grid_size"]
+
+
+def _read_manifest(output_path):
+    manifest_path = os.path.join(output_path, TILE_MANIFEST)
+    if not exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _same_grid(a, b):
+    # The tiling is not part of the grid: the same points can be stored with any tile size
+    return {k: v for k, v in a.items() if k != "tile_size"} == {
+        k: v for k, v in b.items() if k != "tile_size"
+    }
+
+
+def grid_tiles_complete(output_path):
+    """
+    Check whether every tile of the grid saved in ``output_path`` was built, with the tiling it was started with.
+    """
+    manifest = _read_manifest(output_path)
+    if manifest is None:
+        return False
+
+    return all(
+        exists(_tile_path(output_path, tile))
+        for tile in grid_tiles(*_grid_shape(manifest), manifest["tile_size"])
+    )
+
+
+def _check_manifest(output_path, manifest):
+    """
+    Keep the tiles of ``output_path`` if they belong to the same grid as ``manifest``, and discard them otherwise.
+
+    Returns the manifest of the tiles that are kept, whose tile size can differ from the requested one.
+    """
+    existing = _read_manifest(output_path)
+    if existing is not None:
+        if _same_grid(existing, manifest):
+            return existing
+        _log.info(f"Grid definition changed, discarding the tiles in {output_path}")
+        shutil.rmtree(output_path)
+
+    os.makedirs(output_path, exist_ok=True)
+    with open(os.path.join(output_path, TILE_MANIFEST), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def build_grid_tiles(
+    point_map,
+    rivers,
+    coastline,
+    output_path,
+    grid_size=400,
+    tile_size=DEFAULT_TILE_SIZE,
+    n_cores=-1,
+    force_reload=False,
+    crs="EPSG:3395",
+    resolution=None,
+):
+    """
+    Compute a feature grid tile by tile, saving each tile as its own Parquet file.
+
+    By default, the grid is the same as the one of ``statistics.create_point_grid``: ``grid_size`` points along
+    each axis, spread over the bounds of ``point_map``. If ``resolution`` is given, the global grid of that
+    resolution is used instead (see ``global_grid_axes``). The grid is split into ``tile_size`` x ``tile_size`` tiles, and each tile
+    is built on its own: grid points on ``point_map``, distances to the closest river and coastline, and log
+    distances. Memory use is bounded by the tile size rather than the grid size.
+
+    Finished tiles are written to ``output_path`` as they complete. If the run is interrupted, calling this
+    function again with the same arguments only builds the missing tiles.
+
+    Parameters
+    ----------
+    point_map: GeoDataFrame
+        Shapes covered by the grid, in lon-lat coordinates, with an "ISO_A3" column if the points should carry
+        a country code
+    rivers: GeoDataFrame
+        River layer, with "ORD_FLOW" and "HYRIV_ID" columns (see ``load_projected_layer``)
+    coastline: GeoDataFrame
+        Coastline boundaries
+    output_path: str
+        Folder receiving the tiles. Tiles of a different grid (other bounds, grid size or resolution) found there
+        are discarded.
+    grid_size: int, default 400
+        Number of grid points along each axis
+    tile_size: int, default 256
+        Number of grid points along each side of a tile. Only used when the grid is started: a grid found in
+        ``output_path`` is completed with the tile size it was started with.
+    n_cores: int, default -1
+        Number of worker processes. -1 uses every available core.
+    force_reload: bool, default False
+        If True, discard existing tiles and build every tile again
+    crs: str, default "EPSG:3395"
+        Projected CRS in which distances are computed
+    resolution: float, optional
+        Spacing of the global grid, in degrees. Replaces ``grid_size``.
+
+    Returns
+    -------
+    str
+        ``output_path``
+    """
+    if resolution is None:
+        bounds = [float(x) for x in point_map.total_bounds]
+        manifest = {"bounds": bounds, "grid_size": grid_size, "tile_size": tile_size}
+        lon_grid, lat_grid = grid_axes(bounds, grid_size)
+    else:
+        manifest = {"resolution": resolution, "tile_size": tile_size}
+        lon_grid, lat_grid = global_grid_axes(resolution)
+    n_rows, n_cols = _grid_shape(manifest)
+
+    if force_reload and exists(output_path):
+        shutil.rmtree(output_path)
+    manifest = _check_manifest(output_path, manifest)
+    if manifest["tile_size"] != tile_size:
+        _log.info(
+            f"Resuming the grid in {output_path} with its tile size of {manifest['tile_size']}"
+        )
+        tile_size = manifest["tile_size"]
+
+    tiles = [
+        t
+        for t in grid_tiles(n_rows, n_cols, tile_size)
+        if not exists(_tile_path(output_path, t))
+    ]
+    if not tiles:
+        return output_path
+    _log.info(f"Building {len(tiles)} grid tiles in {output_path}")
+
+    initargs = (dissolve_regions(point_map), rivers, coastline, crs)
+
+    if n_cores < 0:
+        n_cores = os.cpu_count() or 1
+    n_cores = max(1, min(n_cores, len(tiles)))
+
+    if n_cores == 1:
+        _init_tile_worker(*initargs)
+        for tile in tqdm(tiles, desc="Building grid tiles"):
+            _build_tile(tile, lon_grid, lat_grid, _tile_path(output_path, tile))
+    else:
+        # Workers build the shapes and the distance indices once, then only receive tile coordinates
+        with ProcessPoolExecutor(
+            n_cores, initializer=_init_tile_worker, initargs=initargs
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _build_tile,
+                    tile,
+                    lon_grid,
+                    lat_grid,
+                    _tile_path(output_path, tile),
+                )
+                for tile in tiles
+            ]
+            for future in tqdm(
+                as_completed(futures), total=len(futures), desc="Building grid tiles"
+            ):
+                future.result()
+
+    return output_path
+
+
+def read_grid_tiles(output_path, columns=None, filters=None):
+    """
+    Read the tiles written by ``build_grid_tiles`` back into one frame.
+
+    Parameters
+    ----------
+    output_path: str
+        Folder holding the tiles
+    columns: list of str, optional
+        Columns to read. If "geometry" is not among them, a plain DataFrame is returned.
+    filters: list, optional
+        Row filters pushed down to the Parquet reader, e.g. ``[("ISO", "in", ["LAO", "THA"])]``. Tiles hold
+        contiguous blocks of cells, so filters on "lon", "lat" or "ISO" skip the tiles with no matching point.
+
+    Returns
+    -------
+    GeoDataFrame or DataFrame
+        Grid points in grid order (latitude first), indexed by "cell_id", the position of the point in the full
+        grid (row * number of columns + column)
+    """
+    # The folder is read as one Parquet dataset; the manifest and unfinished tiles start with "_" and are ignored
+    return read_geo_artifact(output_path, columns=columns, filters=filters).sort_index()
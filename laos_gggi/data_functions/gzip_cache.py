@@ -0,0 +1,163 @@
+import os
+from os.path import exists
+import gzip
+import json
+import logging
+import shutil
+import time
+
+_log = logging.getLogger(__name__)
+
+MARKER_SUFFIX = ".extracted.json"
+
+
+def _marker_path(extracted_path):
+    return extracted_path + MARKER_SUFFIX
+
+
+def _source_signature(gz_path):
+    stat = os.stat(gz_path)
+    return {
+        "source": os.path.abspath(gz_path),
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime,
+    }
+
+
+def _read_marker(extracted_path):
+    try:
+        with open(_marker_path(extracted_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_marker(extracted_path, marker):
+    tmp_path = f"{_marker_path(extracted_path)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(marker, f)
+    os.replace(tmp_path, _marker_path(extracted_path))
+
+
+def is_extracted(gz_path, extracted_path):
+    """
+    Check whether ``extracted_path`` is a complete extraction of the current version of ``gz_path``.
+
+    An extraction is valid only if its integrity marker exists, still describes the source archive (same path,
+    size and modification time), and records the size of the extracted file on disk. Interrupted or stale
+    extractions fail this check and are redone.
+    """
+    marker = _read_marker(extracted_path)
+    if marker is None or not exists(extracted_path):
+        return False
+
+    signature = _source_signature(gz_path)
+    return all(marker.get(k) == v for k, v in signature.items()) and marker.get(
+        "size"
+    ) == os.path.getsize(extracted_path)
+
+
+def extract_gzip(gz_path, cache_dir):
+    """
+    Return the path to a decompressed copy of ``gz_path``, extracting it into ``cache_dir`` if needed.
+
+    Extraction goes to a temporary file that is only moved into place once the whole stream has been
+    decompressed (gzip checks the CRC at the end of the stream). An integrity marker is then written next to
+    it, linking the extracted copy to its source archive.
+
+    Parameters
+    ----------
+    gz_path: str
+        Path to the .gz archive
+    cache_dir: str
+        Folder holding the extracted copies and their markers
+
+    Returns
+    -------
+    str
+        Path to the extracted file
+    """
+    if not exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+
+    fname = os.path.basename(gz_path)
+    if fname.endswith(".gz"):
+        fname = fname[:-3]
+    extracted_path = os.path.join(cache_dir, fname)
+
+    if is_extracted(gz_path, extracted_path):
+        marker = _read_marker(extracted_path)
+    else:
+        _log.info(f"Extracting {gz_path} to {cache_dir}")
+        tmp_path = f"{extracted_path}.{os.getpid()}.partial"
+        try:
+            with gzip.open(gz_path, "rb") as f_in, open(tmp_path, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.replace(tmp_path, extracted_path)
+        finally:
+            if exists(tmp_path):
+                os.remove(tmp_path)
+
+        marker = {
+            **_source_signature(gz_path),
+            "size": os.path.getsize(extracted_path),
+        }
+
+    marker["last_used"] = time.time()
+    _write_marker(extracted_path, marker)
+
+    return extracted_path
+
+
+def enforce_cache_budget(cache_dir, max_bytes=None, keep=()):
+    """
+    Evict extracted files from ``cache_dir`` until their total size fits in ``max_bytes``.
+
+    Extracted copies whose source archive no longer exists are always removed. The others are evicted least
+    recently used first. The source archives are never touched, so an evicted file is simply extracted again
+    the next time it is needed.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Folder managed by ``extract_gzip``
+    max_bytes: int, optional
+        Size budget for the extracted files. If None, only orphaned copies are removed.
+    keep: iterable of str
+        Extracted paths that must not be evicted, even if the budget is exceeded
+    """
+    if not exists(cache_dir):
+        return
+
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    for fname in os.listdir(cache_dir):
+        if not fname.endswith(MARKER_SUFFIX):
+            continue
+        extracted_path = os.path.join(cache_dir, fname[: -len(MARKER_SUFFIX)])
+        marker = _read_marker(extracted_path)
+
+        if marker is None or not exists(marker.get("source", "")):
+            _evict(extracted_path)
+            continue
+        if exists(extracted_path):
+            entries.append((marker.get("last_used", 0), extracted_path))
+
+    if max_bytes is None:
+        return
+
+    total = sum(os.path.getsize(path) for _, path in entries)
+    for _, extracted_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(extracted_path) in keep:
+            continue
+        total -= os.path.getsize(extracted_path)
+        _evict(extracted_path)
+
+
+def _evict(extracted_path):
+    _log.info(f"Evicting {extracted_path} from the extraction cache")
+    for path in (extracted_path, _marker_path(extracted_path)):
+        if exists(path):
+            os.remove(path)
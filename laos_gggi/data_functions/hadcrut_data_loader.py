@@ -2,9 +2,12 @@ from pyprojroot import here
 import os
 from os.path import exists
 from urllib.request import urlretrieve
+from laos_gggi.data_functions.session_cache import cached_loader
 from laos_gggi.const_vars import HADCRUT_URL
-from laos_gggi.data_functions.shapefiles_data_loader import load_shapefile
-import geopandas as geo
+from laos_gggi.data_functions.country_weights import (
+    load_country_weights,
+    reduce_to_countries,
+)
 import pandas as pd
 import xarray as xr
 
@@ -13,7 +16,37 @@ import logging
 _log = logging.getLogger(__name__)
 
 
-def load_hadcrut_data(output_path="data", force_reload=False, repair_ISO_codes=True):
+@cached_loader
+def load_hadcrut_data(
+    output_path="data",
+    force_reload=False,
+    repair_ISO_codes=True,
+    realization_chunk_size=10,
+):
+    """
+    Load HadCRUT surface temperature anomalies, aggregated to annual country means.
+
+    Grid cells are assigned to countries with a cached cell-to-country mask and weighted by cos(latitude), so
+    that each country mean is area weighted. The reduction runs directly on the gridded DataArray. If the
+    raw file holds several ensemble realizations, they are loaded and reduced ``realization_chunk_size`` at a
+    time, then averaged, so memory use does not grow with the size of the ensemble.
+
+    Parameters
+    ----------
+    output_path: str
+        Folder holding the raw and processed HadCRUT data
+    force_reload: bool, default False
+        If True, recompute the processed data even if it exists
+    repair_ISO_codes: bool, default True
+        Passed to ``load_shapefile`` when the country mask is built
+    realization_chunk_size: int, default 10
+        Number of ensemble realizations reduced at once
+
+    Returns
+    -------
+    pd.DataFrame
+        Frame indexed by (ISO, year), with a ``surface_temperature_dev`` column
+    """
     output_path = here(output_path)
     hadcrut_raw_path = os.path.join(output_path, "hadcrut_temperature_raw.nc")
     hadcrut_processed_path = os.path.join(
@@ -31,70 +64,50 @@ def load_hadcrut_data(output_path="data", force_reload=False, repair_ISO_codes=T
 
     # Verify if the hadcrut processed file exists
     if not exists(hadcrut_processed_path) or force_reload:
-        # Import hadcrut processed file
         _log.info("Loading  HADCRUT raw data")
         data = xr.open_dataset(hadcrut_raw_path)
-        df = data["tas_mean"].to_dataframe().reset_index()
-
-        # Import the world shapefile
-        _log.info("Loading world shapefile as GeoDataFrame")
-        world_shapefile = load_shapefile(
-            "world", force_reload=force_reload, repair_ISO_codes=repair_ISO_codes
-        ).rename(
-            columns={
-                "ISO_A3": "country_code",
-                "FORMAL_EN": "country",
-                "CONTINENT": "continent",
-                "REGION_UN": "region",
-            }
-        )
-        _log.info(
-            "Merging HADCRUT data with world shapefile using Lat/Lon (EPSG:4326 coordinates)"
+        tas = data["tas_mean"]
+
+        weights, countries = load_country_weights(
+            tas["latitude"].values,
+            tas["longitude"].values,
+            area_weighted=True,
+            force_reload=force_reload,
+            repair_ISO_codes=repair_ISO_codes,
         )
 
-        df_geo = geo.GeoDataFrame(
-            df,
-            geometry=geo.points_from_xy(df["longitude"], df["latitude"]),
-            crs="EPSG:4326",
+        _log.info("Aggregating HADCRUT data to area-weighted country means")
+        country_tas = reduce_to_countries(
+            tas,
+            weights,
+            countries,
+            lat_dim="latitude",
+            lon_dim="longitude",
+            chunk_dim="realization",
+            chunk_size=realization_chunk_size,
         )
 
-        cols_to_use = [
-            "time",
-            "latitude",
-            "longitude",
-            "realization",
-            "tas_mean",
-            "country_code",
-            "geometry",
-            "country",
-            "continent",
-            "region",
-        ]
-
-        result_df = df_geo.sjoin(world_shapefile, how="inner", predicate="intersects")[
-            cols_to_use
-        ].rename(columns={"tas_mean": "surface_temperature_dev"})
-
-        result_df["year"] = pd.to_datetime(result_df["time"].dt.year, format="%Y")
+        annual_tas = country_tas.groupby("time.year").mean()
+        if "realization" in annual_tas.dims:
+            annual_tas = annual_tas.mean("realization")
 
         result_df = (
-            result_df.pivot_table(
-                values="surface_temperature_dev",
-                index=["country_code", "year"],
-                aggfunc="mean",
-            )
+            annual_tas.sel(year=annual_tas.year > 1959)
+            .rename("surface_temperature_dev")
+            .to_dataframe()[["surface_temperature_dev"]]
+            .dropna()
             .reset_index()
-            .rename(columns={"country_code": "ISO"})
-            .query("year >1959")
+            .assign(year=lambda x: pd.to_datetime(x.year, format="%Y"))
             .set_index(["ISO", "year"])
+            .sort_index()
         )
 
-        _log.info(f"Saving processed GPCC data to {hadcrut_processed_path}")
+        _log.info(f"Saving processed HADCRUT data to {hadcrut_processed_path}")
         result_df.to_csv(hadcrut_processed_path)
     else:
         result_df = (
             pd.read_csv(hadcrut_processed_path)
-            .assign(year=lambda x: pd.to_datetime(x, format="%Y-%m-%d"))
+            .assign(year=lambda x: pd.to_datetime(x.year, format="%Y-%m-%d"))
             .set_index(["ISO", "year"])
         )
 
@@ -0,0 +1,226 @@
+from collections.abc import MutableMapping
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+import logging
+import os
+import time
+
+_log = logging.getLogger(__name__)
+
+
+class LazyDataDict(MutableMapping):
+    """
+    Dictionary whose values are computed on first access.
+
+    Each key is registered with a function and the keys it depends on. Reading a key computes its dependencies
+    first (recursively), passes them to the function as positional arguments, and stores the result, so every
+    key is computed at most once. Keys that are never read are never computed.
+
+    Keys starting with an underscore hold intermediate results shared by several keys. They can be read like
+    any other key, but are hidden from iteration, ``len`` and ``repr``.
+
+    Reading every key (e.g. with ``.items()`` or ``dict(data)``) computes everything, like an ordinary dict.
+    ``compute`` does the same, but runs independent keys concurrently. The time spent computing each key is
+    recorded in ``timings``.
+    """
+
+    def __init__(self):
+        self._nodes = {}
+        self._values = {}
+        self.timings = {}
+
+    def add(self, key, func, deps=()):
+        """
+        Register how to compute ``key``.
+
+        Parameters
+        ----------
+        key: str
+            Name of the value
+        func: callable
+            Function computing the value. It receives the values of ``deps``, in order, as positional arguments.
+        deps: tuple of str
+            Keys the value depends on
+        """
+        self._nodes[key] = (func, tuple(deps))
+        self._invalidate(key)
+
+    def rename(self, key, new_key):
+        """
+        Move ``key`` to ``new_key``, keeping its value if it was computed. Keys depending on ``key`` are updated
+        to depend on ``new_key``.
+        """
+        if key not in self:
+            raise KeyError(key)
+        if new_key in self:
+            raise ValueError(f"Key {new_key} already exists")
+
+        if key in self._nodes:
+            self._nodes[new_key] = self._nodes.pop(key)
+        for store in (self._values, self.timings):
+            if key in store:
+                store[new_key] = store.pop(key)
+
+        for other, (func, deps) in self._nodes.items():
+            if key in deps:
+                self._nodes[other] = (
+                    func,
+                    tuple(new_key if d == key else d for d in deps),
+                )
+
+    def dependencies(self, key):
+        """
+        Return the keys ``key`` directly depends on.
+        """
+        if key in self._nodes:
+            return self._nodes[key][1]
+        if key in self._values:
+            return ()
+        raise KeyError(key)
+
+    def is_computed(self, key):
+        """
+        Check whether ``key`` has already been computed, without computing it.
+        """
+        return key in self._values
+
+    def _compute(self, key, path=()):
+        if key in self._values:
+            return self._values[key]
+        if key in path:
+            cycle = " -> ".join([*path, key])
+            raise ValueError(f"Circular dependency between keys: {cycle}")
+        if key not in self._nodes:
+            raise KeyError(key)
+
+        func, deps = self._nodes[key]
+        args = [self._compute(dep, (*path, key)) for dep in deps]
+
+        _log.debug(f"Computing {key}")
+        self._values[key], self.timings[key] = _timed_call(func, *args)
+
+        return self._values[key]
+
+    def _pending(self, keys):
+        # Every key needed to compute ``keys`` that has not been computed yet
+        pending = set()
+        stack = list(keys)
+        while stack:
+            key = stack.pop()
+            if key in pending or key in self._values:
+                continue
+            if key not in self._nodes:
+                raise KeyError(key)
+            pending.add(key)
+            stack.extend(self._nodes[key][1])
+        return pending
+
+    def compute(self, keys=None, max_workers=None, executor="thread"):
+        """
+        Compute several keys at once, running keys that do not depend on each other concurrently.
+
+        Keys are submitted to a pool as soon as all their dependencies are available, so the total time is
+        roughly that of the slowest chain of dependencies rather than the sum over all keys.
+
+        Parameters
+        ----------
+        keys: list of str, optional
+            Keys to compute, together with their dependencies. Defaults to every key, including hidden ones.
+        max_workers: int, optional
+            Size of the pool. If -1, use all available cores. If None, use the default of the executor.
+        executor: str, default "thread"
+            One of "thread" or "process". With "process", only keys without dependencies (typically the
+            loaders reading from disk) are sent to worker processes; keys derived from them run in the calling
+            process, so intermediate results are not pickled back and forth. Their functions and results must
+            be picklable.
+
+        Returns
+        -------
+        LazyDataDict
+            The mapping itself
+        """
+        if executor not in ("thread", "process"):
+            raise ValueError(
+                f"executor should be one of 'thread' or 'process', got {executor}"
+            )
+        if max_workers == -1:
+            max_workers = os.cpu_count()
+
+        pending = self._pending(self._nodes if keys is None else keys)
+        pool_cls = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+
+        with pool_cls(max_workers=max_workers) as pool:
+            running = {}
+            while pending or running:
+                ready = [
+                    key
+                    for key in pending
+                    if all(dep in self._values for dep in self._nodes[key][1])
+                ]
+                for key in ready:
+                    pending.discard(key)
+                    func, deps = self._nodes[key]
+                    args = [self._values[dep] for dep in deps]
+                    if executor == "process" and deps:
+                        self._values[key], self.timings[key] = _timed_call(func, *args)
+                    else:
+                        _log.debug(f"Computing {key}")
+                        running[pool.submit(_timed_call, func, *args)] = key
+
+                if ready and not running:
+                    continue
+                if not running:
+                    cycle = ", ".join(sorted(pending))
+                    raise ValueError(f"Circular dependency between keys: {cycle}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    self._values[key], self.timings[key] = future.result()
+
+        return self
+
+    def _invalidate(self, key):
+        # Values computed from the old value of ``key`` are stale
+        self._values.pop(key, None)
+        for other, (_, deps) in self._nodes.items():
+            if key in deps and other in self._values:
+                self._invalidate(other)
+
+    def __getitem__(self, key):
+        return self._compute(key)
+
+    def __setitem__(self, key, value):
+        self._invalidate(key)
+        self._nodes.pop(key, None)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._invalidate(key)
+        self._nodes.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._nodes or key in self._values
+
+    def __iter__(self):
+        keys = list(self._nodes) + [k for k in self._values if k not in self._nodes]
+        return (k for k in keys if not k.startswith("_"))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        status = {k: "computed" if k in self._values else "pending" for k in self}
+        return f"{type(self).__name__}({status})"
+
+
+def _timed_call(func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    return value, time.perf_counter() - start
@@ -2,9 +2,19 @@ from pyprojroot import here
 import pandas as pd
 import os
 from os.path import exists
+from laos_gggi.data_functions.session_cache import cached_loader
 from laos_gggi.const_vars import OCEAN_HEAT_FILENAME, OCEAN_HEAT_URL
 
 
+def _ocean_heat_sources(data_path=None):
+    return [
+        os.path.join(
+            here("data") if data_path is None else data_path, OCEAN_HEAT_FILENAME
+        )
+    ]
+
+
+@cached_loader(sources=_ocean_heat_sources)
 def load_ocean_heat_data(data_path=None):
     if data_path is None:
         data_path = here("data")
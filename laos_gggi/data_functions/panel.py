@@ -0,0 +1,238 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from laos_gggi.const_vars import PROB_COLS
+
+PANEL_INDEX = ["ISO", "year"]
+
+# Event counts, stored as integers by ``compact_frame``. Every other numeric column is a measure and stays float.
+COUNT_COLUMNS = [
+    col
+    for col in PROB_COLS
+    if col not in ["Country", "ISO", "Start_Year", "Region", "Subregion"]
+] + ["climatological_disasters", "hydrological_disasters"]
+
+
+def _years(values):
+    if isinstance(values, pd.DatetimeIndex):
+        return values.year.to_numpy(dtype="int64")
+    return np.asarray(values, dtype="int64")
+
+
+def _normalize_index(index, categories, year_dtype="int64"):
+    return pd.MultiIndex.from_arrays(
+        [
+            pd.Categorical(
+                index.get_level_values(0).astype(str), categories=categories
+            ),
+            _years(index.get_level_values(1)).astype(year_dtype),
+        ],
+        names=PANEL_INDEX,
+    )
+
+
+def normalize_panel_index(df, categories=None):
+    """
+    Relabel a panel frame with the common (ISO, year) index used to assemble panels.
+
+    Parameters
+    ----------
+    df: pd.DataFrame or pd.Series
+        Panel data with a two-level (ISO code, time) MultiIndex. The time level can hold integer years or
+        datetimes, under any name (e.g. "Start_Year" or "year").
+    categories: list of str, optional
+        Categories of the ISO level. Defaults to the sorted ISO codes of ``df``. Frames that will be aligned
+        should share the same categories.
+
+    Returns
+    -------
+    pd.DataFrame or pd.Series
+        The same data, indexed by ("ISO" categorical, "year" int64). Only the index is rebuilt.
+    """
+    if categories is None:
+        categories = np.sort(df.index.get_level_values(0).astype(str).unique())
+
+    return df.set_axis(_normalize_index(df.index, categories), axis=0)
+
+
+def filter_panel(df, iso_codes=None, years=None):
+    """
+    Keep the rows of a panel or time series frame that belong to the selected countries and years.
+
+    Parameters
+    ----------
+    df: pd.DataFrame or pd.Series
+        Frame indexed by (ISO code, time) or by time only. Times can be years or datetimes.
+    iso_codes: collection of str, optional
+        Countries to keep. Ignored for frames indexed by time only.
+    years: tuple of int, optional
+        First and last year to keep, both included
+
+    Returns
+    -------
+    pd.DataFrame or pd.Series
+        The selected rows
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if isinstance(df.index, pd.MultiIndex):
+        time = df.index.get_level_values(1)
+        if iso_codes is not None:
+            mask &= df.index.get_level_values(0).astype(str).isin(list(iso_codes))
+    else:
+        time = df.index
+
+    if years is not None:
+        year = _years(time)
+        mask &= (year >= years[0]) & (year <= years[1])
+
+    return df.loc[mask]
+
+
+def build_panel(sources, year_sources=(), index=None):
+    """
+    Assemble a (ISO, year) panel from several sources with a single aligned concat.
+
+    Every source is first relabeled with a common (ISO categorical, int year) index, then all of them are
+    aligned to the same row index and concatenated column-wise once. Year-level sources (e.g. CO2 or ocean
+    temperature) are broadcast across countries by indexing them with the year of every row, without merging.
+
+    Parameters
+    ----------
+    sources: list of pd.DataFrame or pd.Series
+        Panel data with a two-level (ISO code, time) MultiIndex. See ``normalize_panel_index``.
+    year_sources: list of pd.DataFrame or pd.Series
+        Data indexed by year only (integer years or datetimes)
+    index: pd.MultiIndex, optional
+        (ISO, time) rows of the panel, e.g. the index of one of the sources to reproduce a left join. Defaults to
+        the union of the indices of ``sources`` (an outer join).
+
+    Returns
+    -------
+    pd.DataFrame
+        The panel, indexed by ("ISO" categorical, "year" int64) and sorted unless ``index`` was given. Series
+        become columns named after the series.
+    """
+    sources = [s.to_frame() if isinstance(s, pd.Series) else s for s in sources]
+    iso_codes = [s.index.get_level_values(0).astype(str) for s in sources]
+    if index is not None:
+        iso_codes.append(index.get_level_values(0).astype(str))
+    categories = np.sort(reduce(lambda a, b: a.union(b), iso_codes).unique())
+
+    sources = [normalize_panel_index(s, categories) for s in sources]
+    if index is None:
+        index = reduce(
+            lambda a, b: a.union(b), [s.index for s in sources]
+        ).sort_values()
+    else:
+        index = _normalize_index(index, categories)
+
+    panel = pd.concat(
+        [s if s.index.equals(index) else s.reindex(index) for s in sources], axis=1
+    )
+
+    years = index.get_level_values("year")
+    for source in year_sources:
+        if isinstance(source, pd.Series):
+            source = source.to_frame()
+        source = source.set_axis(_years(source.index), axis=0)
+        for col in source.columns:
+            panel[col] = source[col].reindex(years).to_numpy()
+
+    return panel
+
+
+def build_time_series(*sources):
+    """
+    Assemble year-level sources into one frame with a single outer-aligned concat, sorted by year.
+    """
+    return pd.concat(sources, axis=1).sort_index()
+
+
+def to_legacy_index(df, time_name="Start_Year"):
+    """
+    Convert a panel indexed by ("ISO" categorical, "year" int) back to (ISO string, datetime year) labels.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Panel from ``build_panel``
+    time_name: str, default "Start_Year"
+        Name of the datetime level
+
+    Returns
+    -------
+    pd.DataFrame
+        The same data, indexed by (ISO, ``time_name``)
+    """
+    index = pd.MultiIndex.from_arrays(
+        [
+            df.index.get_level_values("ISO").astype(str),
+            pd.to_datetime(df.index.get_level_values("year").astype(str), format="%Y"),
+        ],
+        names=["ISO", time_name],
+    )
+    return df.set_axis(index, axis=0)
+
+
+def _compact_column(col, float32, is_count):
+    if pd.api.types.is_bool_dtype(col) or isinstance(col.dtype, pd.CategoricalDtype):
+        return col
+    if not pd.api.types.is_numeric_dtype(col):
+        return col.astype("category")
+    if pd.api.types.is_integer_dtype(col):
+        return pd.to_numeric(col, downcast="integer")
+
+    # Counts are stored as floats after sums and reindexing; store them as the smallest integer type that fits.
+    # Counts with missing values stay float.
+    if is_count and np.isfinite(col.to_numpy()).all():
+        return pd.to_numeric(col, downcast="integer")
+    if float32:
+        return col.astype("float32")
+    return col
+
+
+def compact_frame(df, float32=False, count_columns=None):
+    """
+    Convert a panel or time series frame to a compact representation.
+
+    The index becomes ("ISO" categorical, "year" int16) for panels, "year" int16 for time series and "ISO"
+    categorical for country-level frames. Text columns become categoricals, and event counts are downcast to the
+    smallest integer type that fits them. Other numeric columns (damages, covariates, ...) keep their dtype, so
+    the dtype of a column never depends on its values.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Frame indexed by (ISO, time), by time only (years or datetimes), or by ISO only
+    float32: bool, default False
+        If True, the float columns that are not counts are stored as float32
+    count_columns: list of str, optional
+        Columns holding event counts. Defaults to ``COUNT_COLUMNS``, the disaster types.
+
+    Returns
+    -------
+    pd.DataFrame
+        The compact frame
+    """
+    index = df.index
+    if isinstance(index, pd.MultiIndex):
+        categories = np.sort(index.get_level_values(0).astype(str).unique())
+        index = _normalize_index(index, categories, year_dtype="int16")
+    elif index.name == "ISO":
+        index = pd.CategoricalIndex(index.astype(str), name="ISO")
+    else:
+        index = pd.Index(_years(index).astype("int16"), name="year")
+
+    if count_columns is None:
+        count_columns = COUNT_COLUMNS
+
+    compact = pd.DataFrame(
+        {
+            col: _compact_column(df[col], float32, col in count_columns)
+            for col in df.columns
+        },
+        index=df.index,
+    )
+    return compact.set_axis(index, axis=0).rename_axis(columns=df.columns.name)
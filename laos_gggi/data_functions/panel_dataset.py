@@ -0,0 +1,203 @@
+from pyprojroot import here
+import os
+from os.path import exists
+import json
+import logging
+import shutil
+
+import numpy as np
+import xarray as xr
+
+from laos_gggi.data_functions.combine_data import load_all_data
+from laos_gggi.data_functions.panel import normalize_panel_index
+
+_log = logging.getLogger(__name__)
+
+# Columns that only vary across countries; they are stored as coordinates along "ISO"
+COUNTRY_COORDS = ["Region", "Subregion"]
+
+# Arguments of load_all_data that change how the panel is computed, but not its content
+EXECUTION_ARGS = ["max_workers", "executor"]
+
+
+def panel_to_dataset(df_panel):
+    """
+    Convert a (ISO, year) panel frame to a dense xarray Dataset.
+
+    Parameters
+    ----------
+    df_panel: pd.DataFrame
+        Panel indexed by (ISO code, time), e.g. ``load_all_data()["df_panel"]``. The time level can hold years
+        or datetimes.
+
+    Returns
+    -------
+    xr.Dataset
+        One variable per numeric column, with dims ("ISO", "year"). Country pairs missing from the panel are
+        NaN. Region and Subregion, if present, become coordinates along "ISO".
+    """
+    df_panel = normalize_panel_index(df_panel)
+    coord_cols = [c for c in COUNTRY_COORDS if c in df_panel.columns]
+
+    values = df_panel.drop(columns=coord_cols).astype("float64")
+    ds = values.to_xarray()
+    ds = ds.assign_coords(ISO=ds["ISO"].astype(str), year=ds["year"].astype("int16"))
+
+    for col in coord_cols:
+        per_country = (
+            df_panel[col]
+            .dropna()
+            .groupby(level="ISO", observed=True)
+            .last()
+            .reindex(ds["ISO"].values)
+        )
+        ds = ds.assign_coords(
+            {col: ("ISO", per_country.fillna("").to_numpy(dtype=object))}
+        )
+
+    return ds
+
+
+def write_panel_dataset(ds, fpath, chunk_size=64):
+    """
+    Save a panel Dataset as a compressed Zarr store, chunked along "ISO".
+
+    The store is written next to ``fpath`` and moved into place once complete, so an interrupted write never
+    leaves a partial store behind.
+
+    Parameters
+    ----------
+    ds: xr.Dataset
+        Output of ``panel_to_dataset``
+    fpath: str
+        Path to the .zarr store. An existing store is replaced.
+    chunk_size: int, default 64
+        Number of countries per chunk. Each chunk holds every year.
+    """
+    tmp_path = f"{fpath}.{os.getpid()}.partial"
+    if exists(tmp_path):
+        shutil.rmtree(tmp_path)
+
+    chunks = (min(chunk_size, ds.sizes["ISO"]), ds.sizes["year"])
+    encoding = {var: {"chunks": chunks} for var in ds.data_vars}
+    ds.to_zarr(tmp_path, mode="w", encoding=encoding)
+
+    if exists(fpath):
+        shutil.rmtree(fpath)
+    os.replace(tmp_path, fpath)
+
+
+def select_panel_dataset(ds, iso_list=None, region=None, years=None):
+    """
+    Select countries and years from a panel Dataset.
+
+    Selection only uses the coordinates, so on a lazily opened store only the chunks holding the selected
+    countries are read afterwards.
+
+    Parameters
+    ----------
+    ds: xr.Dataset
+        Panel with dims ("ISO", "year")
+    iso_list: list of str, optional
+        Countries to keep
+    region: str or list of str, optional
+        EM-DAT regions or subregions to keep
+    years: tuple of int, optional
+        First and last year to keep, both included
+
+    Returns
+    -------
+    xr.Dataset
+        The selection
+    """
+    keep = np.ones(ds.sizes["ISO"], dtype=bool)
+    if iso_list is not None:
+        keep &= np.isin(ds["ISO"].values.astype(object), list(iso_list))
+    if region is not None:
+        regions = [region] if isinstance(region, str) else list(region)
+        in_region = np.zeros_like(keep)
+        for col in COUNTRY_COORDS:
+            if col in ds.coords:
+                in_region |= np.isin(ds[col].values.astype(object), regions)
+        keep &= in_region
+
+    ds = ds.isel(ISO=np.flatnonzero(keep))
+    if years is not None:
+        ds = ds.sel(year=slice(*years))
+
+    return ds
+
+
+def _build_args(kwargs):
+    # Tuples and lists serialize alike, so the stored value compares equal to a fresh one
+    return json.dumps(
+        {k: v for k, v in kwargs.items() if k not in EXECUTION_ARGS},
+        sort_keys=True,
+        default=repr,
+    )
+
+
+def load_panel_dataset(
+    output_path="data/panel.zarr",
+    force_reload=False,
+    chunk_size=64,
+    iso_list=None,
+    region=None,
+    years=None,
+    **kwargs,
+):
+    """
+    Load the country-year panel of ``load_all_data`` as a lazily read xarray Dataset.
+
+    The panel is built once with ``load_all_data``, converted to a dense (ISO, year) Dataset and saved as a
+    chunked, compressed Zarr store. Later calls open the store without touching the pandas pipeline. Data is
+    only read from disk when it is used, one chunk of countries at a time, so selecting a few countries or a
+    period (e.g. ``ds.sel(ISO=["LAO", "THA"], year=slice(1990, 2020))``) only reads the chunks it needs.
+
+    Parameters
+    ----------
+    output_path: str, default "data/panel.zarr"
+        Path to the Zarr store
+    force_reload: bool, default False
+        If True, rebuild the store from ``load_all_data`` even if it exists
+    chunk_size: int, default 64
+        Number of countries per chunk, when the store is built
+    iso_list: list of str, optional
+        Only return these countries. See ``select_panel_dataset``.
+    region: str or list of str, optional
+        Only return the countries of these EM-DAT regions or subregions
+    years: tuple of int, optional
+        Only return these years, both included
+    **kwargs
+        Passed to ``load_all_data`` when the store is built. They are saved with the store, and a store built
+        with other arguments is rebuilt. ``max_workers`` and ``executor`` do not change the panel and are
+        ignored in that check.
+
+    Returns
+    -------
+    xr.Dataset
+        Panel variables with dims ("ISO", "year"), "year" holding integer years
+    """
+    fpath = str(here(output_path))
+    build_args = _build_args(kwargs)
+
+    ds = None
+    if exists(fpath) and not force_reload:
+        ds = xr.open_zarr(fpath, chunks=None)
+        if ds.attrs.get("build_args") != build_args:
+            _log.info(
+                f"The panel dataset at {fpath} was built with other arguments, rebuilding it"
+            )
+            ds = None
+
+    if ds is None:
+        _log.info(f"Building the panel dataset at {fpath}")
+        df_panel = load_all_data(**kwargs)["df_panel"]
+        write_panel_dataset(
+            panel_to_dataset(df_panel).assign_attrs(build_args=build_args),
+            fpath,
+            chunk_size=chunk_size,
+        )
+        ds = xr.open_zarr(fpath, chunks=None)
+
+    return select_panel_dataset(ds, iso_list=iso_list, region=region, years=years)
@@ -4,21 +4,48 @@ import os
 import numpy as np
 import geopandas as gpd
 
-from laos_gggi.data_functions.rivers_data_loader import load_rivers_data
 from laos_gggi.data_functions.emdat_processing import load_emdat_data
-from laos_gggi.data_functions.shapefiles_data_loader import load_shapefile
+from laos_gggi.data_functions.shapefiles_data_loader import (
+    load_shapefile,
+    load_projected_layer,
+)
 from laos_gggi.const_vars import (
     RIVERS_HYDRO_DAMAGE_FILENAME,
     RIVERS_FLOODS_DAMAGE_FILENAME,
     LAOS_LOCATION_DICTIONARY,
 )
+from laos_gggi.data_functions.artifact_store import (
+    read_geo_artifact,
+    write_geo_artifact,
+    geo_artifact_exists,
+    select_columns,
+)
 from laos_gggi.statistics import get_distance_to_rivers
 
-
-def create_hydro_rivers_damage():
-    data_path = here("data")
-    if not os.path.isfile(os.path.join(data_path, RIVERS_HYDRO_DAMAGE_FILENAME)):
-        big_rivers = load_rivers_data()
+# Truncated column names of the shapefiles written by earlier versions
+HYDRO_DAMAGE_SHAPEFILE_RENAME = {
+    "River Basi": "River Basin",
+    "Total_Dama": "Total_Damage_Hydro",
+    "Total_Affe": "Total_Affected_Hydro",
+    "closest_ri": "closest_river",
+    "log_damage": "log_damage_hydro",
+    "log_affect": "log_affected_hydro",
+}
+
+FLOODS_DAMAGE_SHAPEFILE_RENAME = {
+    "River Basi": "River Basin",
+    "Total_Dama": "Total_Damage_Flood",
+    "Total_Affe": "Total_Affected_Flood",
+    "closest_ri": "closest_river",
+    "log_damage": "log_damage_floods",
+    "log_affect": "log_affected_floods",
+}
+
+
+def create_hydro_rivers_damage(columns=None):
+    fpath = os.path.join(here("data"), RIVERS_HYDRO_DAMAGE_FILENAME)
+    if not geo_artifact_exists(fpath):
+        big_rivers = load_projected_layer("rivers")
         emdat = load_emdat_data()
 
         world = load_shapefile("world", repair_ISO_codes=True)
@@ -72,27 +99,21 @@ def create_hydro_rivers_damage():
             log_affected_hydro=lambda x: np.log(x.Total_Affected_Hydro)
         )
 
-        damage_df.to_file(os.path.join(data_path, RIVERS_HYDRO_DAMAGE_FILENAME))
+        write_geo_artifact(damage_df, fpath)
+        damage_df = select_columns(damage_df, columns)
 
     else:
-        damage_df = gpd.read_file(os.path.join(data_path, RIVERS_HYDRO_DAMAGE_FILENAME))
-        damage_df = damage_df.rename(
-            columns={
-                "River Basi": "River Basin",
-                "Total_Dama": "Total_Damage_Hydro",
-                "Total_Affe": "Total_Affected",
-                "closest_ri": "closest_river",
-                "log_damage": "log_damage_hydro",
-            }
+        damage_df = read_geo_artifact(
+            fpath, columns=columns, legacy_rename=HYDRO_DAMAGE_SHAPEFILE_RENAME
         )
 
     return damage_df
 
 
-def create_floods_rivers_damage():
-    data_path = here("data")
-    if not os.path.isfile(os.path.join(data_path, RIVERS_FLOODS_DAMAGE_FILENAME)):
-        big_rivers = load_rivers_data()
+def create_floods_rivers_damage(columns=None):
+    fpath = os.path.join(here("data"), RIVERS_FLOODS_DAMAGE_FILENAME)
+    if not geo_artifact_exists(fpath):
+        big_rivers = load_projected_layer("rivers")
         emdat = load_emdat_data()
         world = load_shapefile("world", repair_ISO_codes=True)
 
@@ -160,21 +181,12 @@ def create_floods_rivers_damage():
             log_affected_floods=lambda x: np.log(x.Total_Affected_Flood)
         )
 
-        damage_df_f.to_file(os.path.join(data_path, RIVERS_FLOODS_DAMAGE_FILENAME))
+        write_geo_artifact(damage_df_f, fpath)
+        damage_df_f = select_columns(damage_df_f, columns)
 
     else:
-        damage_df_f = gpd.read_file(
-            os.path.join(data_path, RIVERS_FLOODS_DAMAGE_FILENAME)
-        )
-        damage_df_f = damage_df_f.rename(
-            columns={
-                "River Basi": "River Basin",
-                "Total_Dama": "Total_Damage_floods",
-                "Total_Affe": "Total_Affected_floods",
-                "closest_ri": "closest_river",
-                "log_damage": "log_damage_floods",
-                "log_affect": "log_affected_floods",
-            }
+        damage_df_f = read_geo_artifact(
+            fpath, columns=columns, legacy_rename=FLOODS_DAMAGE_SHAPEFILE_RENAME
         )
 
     return damage_df_f
@@ -1,25 +1,92 @@
 from pyprojroot import here
 import os
 from os.path import exists
+from laos_gggi.data_functions.session_cache import cached_loader
 from laos_gggi.const_vars import (
     RIVERS_URL,
     RIVERS_SHAPEFILE_FILENAME,
     RIVERS_ZIP_FILENAME,
     BIG_RIVERS_FILENAME,
 )
+from laos_gggi.data_functions.artifact_store import (
+    geo_artifact_exists,
+    read_geo_artifact,
+    write_geo_artifact,
+    select_columns,
+)
+import hashlib
 import logging
 import urllib.request
 from zipfile import ZipFile
 
 import geopandas as gpd
+import shapely
 
 _log = logging.getLogger(__name__)
 
+DEFAULT_RIVERS_QUERY = "ORD_FLOW < 5"
+
+
+def _filtered_rivers_filename(where, bbox, region):
+    if where == DEFAULT_RIVERS_QUERY and bbox is None and region is None:
+        return BIG_RIVERS_FILENAME
+
+    key = repr((where, None if bbox is None else tuple(map(float, bbox))))
+    if region is not None:
+        key += shapely.to_wkb(region).hex()
+
+    name, ext = os.path.splitext(BIG_RIVERS_FILENAME)
+    return f"{name}_{hashlib.md5(key.encode()).hexdigest()[:8]}{ext}"
+
 
-def load_rivers_data(data_path=here("data/rivers")):
+@cached_loader
+def load_rivers_data(
+    data_path=here("data/rivers"),
+    where=DEFAULT_RIVERS_QUERY,
+    bbox=None,
+    region=None,
+    columns=None,
+):
+    """
+    Load the HydroRIVERS river network, keeping only the segments that match a filter.
+
+    Both filters are pushed down into the shapefile reader, so rejected segments are never materialized as
+    geometries. Each filtered subset is cached next to the raw data.
+
+    Parameters
+    ----------
+    data_path: str
+        Folder where the raw HydroRIVERS data and the filtered subsets are stored
+    where: str, default "ORD_FLOW < 5"
+        SQL WHERE clause on the HydroRIVERS attributes. Pass None to keep every segment.
+    bbox: tuple of float, optional
+        (lon_min, lat_min, lon_max, lat_max) bounding box, in EPSG:4326
+    region: GeoDataFrame, GeoSeries or shapely geometry, optional
+        Only segments intersecting this region (in EPSG:4326) are loaded
+    columns: list of str, optional
+        Columns to return. Only these are read from the cached subset.
+
+    Returns
+    -------
+    GeoDataFrame
+        The selected river segments
+    """
     path_to_zip_file = os.path.join(data_path, RIVERS_ZIP_FILENAME)
-    path_to_shapefile = os.path.join(data_path, RIVERS_SHAPEFILE_FILENAME)
-    path_to_big_rivers = os.path.join(data_path, BIG_RIVERS_FILENAME)
+    path_to_shapefile = os.path.join(
+        data_path, "HydroRIVERS_v10_shp", RIVERS_SHAPEFILE_FILENAME
+    )
+
+    if isinstance(region, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        region = region.to_crs("EPSG:4326").union_all()
+
+    # The reader accepts either a bbox or a mask, not both
+    if region is not None and bbox is not None:
+        region = region.intersection(shapely.box(*bbox))
+        bbox = None
+
+    path_to_big_rivers = os.path.join(
+        data_path, _filtered_rivers_filename(where, bbox, region)
+    )
 
     if not exists(data_path):
         os.makedirs(data_path)
@@ -40,18 +107,14 @@ def load_rivers_data(data_path=here("data/rivers")):
         with ZipFile(here(path_to_zip_file), "r") as zObject:
             zObject.extractall(path=here(data_path))
 
-    if not os.path.isfile(here(path_to_big_rivers)):
+    if not geo_artifact_exists(here(path_to_big_rivers)):
         _log.info("Loading and processing rivers data")
-        df = gpd.read_file(
-            here(
-                os.path.join(
-                    "data", "rivers", "HydroRIVERS_v10_shp", "HydroRIVERS_v10.shp"
-                )
-            )
+        big_rivers = gpd.read_file(
+            here(path_to_shapefile), where=where, bbox=bbox, mask=region
         )
-        big_rivers = df.query("ORD_FLOW < 5")
-        big_rivers.to_file(here(path_to_big_rivers))
+        write_geo_artifact(big_rivers, here(path_to_big_rivers))
+        big_rivers = select_columns(big_rivers, columns)
     else:
-        big_rivers = gpd.read_file(here(path_to_big_rivers))
+        big_rivers = read_geo_artifact(here(path_to_big_rivers), columns=columns)
 
     return big_rivers
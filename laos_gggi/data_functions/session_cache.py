@@ -0,0 +1,279 @@
+from collections import OrderedDict, namedtuple
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import shapely
+import xarray as xr
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 4 * 1024**3
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "entries", "nbytes", "max_bytes"]
+)
+
+
+class _Unhashable(Exception):
+    pass
+
+
+def _freeze(value):
+    # Turn loader arguments into a hashable key
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, pd.Index):
+        return (str(value.dtype), tuple(value))
+    try:
+        hash(value)
+    except TypeError:
+        raise _Unhashable(type(value).__name__)
+    return value
+
+
+def _file_signature(paths):
+    # Size and modification time of the source files, so a replaced file changes the cache key
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signature.append((str(path), None))
+            continue
+        signature.append((str(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def _sizeof(value):
+    """
+    Approximate the memory held by a loader result, in bytes.
+    """
+    if isinstance(value, pd.DataFrame):
+        size = int(value.memory_usage(deep=True).sum())
+        # Geometries only report the size of their pointers; count their coordinates instead
+        for col, dtype in value.dtypes.items():
+            if str(dtype) == "geometry":
+                size += 16 * int(shapely.get_num_coordinates(value[col].values).sum())
+        return size
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (np.ndarray, xr.DataArray, xr.Dataset)):
+        return int(value.nbytes)
+    if hasattr(value, "data") and hasattr(value, "indices"):
+        # scipy sparse arrays
+        return int(value.data.nbytes + value.indices.nbytes + value.indptr.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sum(_sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_sizeof(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+def _copy(value):
+    if isinstance(
+        value, (pd.DataFrame, pd.Series, np.ndarray, xr.DataArray, xr.Dataset)
+    ):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return value
+
+
+class SessionCache:
+    """
+    In-memory cache of loader results, shared by every loader of the package for the life of the process.
+
+    Results are keyed on the loader name and its arguments (after filling in defaults), so each source is read
+    from disk once per session. Entries are evicted least recently used first once their total size exceeds
+    ``max_bytes``. Sizes are estimates (pandas deep memory usage, plus the coordinates of any geometries).
+
+    Calling a loader with ``force_reload=True`` always runs it, and replaces the cached result. Loaders that
+    declare their source files (see ``cached``) also miss the cache when one of them changes size or
+    modification time; for the others, call ``clear`` after changing a source on disk.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self._max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        with self._lock:
+            self._max_bytes = value
+            self._evict()
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def info(self):
+        """
+        Return hit and miss counts, number of entries and memory use of the cache.
+        """
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, len(self._entries), self.nbytes, self._max_bytes
+            )
+
+    def clear(self, loader=None):
+        """
+        Drop cached results, and reset the statistics.
+
+        Parameters
+        ----------
+        loader: str or callable, optional
+            Only drop the results of this loader. Its statistics are kept.
+        """
+        if loader is not None:
+            name = loader if isinstance(loader, str) else _loader_name(loader)
+            with self._lock:
+                for key in [k for k in self._entries if k[0] == name]:
+                    self._drop(key)
+            return
+
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._key_locks.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        self._sizes.pop(key, None)
+        self._key_locks.pop(key, None)
+
+    def _evict(self):
+        while self._entries and self.nbytes > self._max_bytes:
+            key = next(iter(self._entries))
+            _log.debug(f"Evicting {key[0]} from the session cache")
+            self._drop(key)
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            return False, None
+
+    def _put(self, key, value):
+        size = _sizeof(value)
+        with self._lock:
+            # Results read from older versions of the source files can never be hit again
+            for stale in [k for k in self._entries if k[:2] == key[:2] and k != key]:
+                self._drop(stale)
+            self._entries.pop(key, None)
+            self._sizes.pop(key, None)
+            if size > self._max_bytes:
+                _log.debug(
+                    f"{key[0]} result is larger than the session cache, not caching"
+                )
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._evict()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _release_key_lock(self, key):
+        # Locks of keys that did not end up cached (errors, results too large to cache) are not kept around
+        with self._lock:
+            if key not in self._entries:
+                self._key_locks.pop(key, None)
+
+    def cached(self, func=None, *, copy=True, sources=None):
+        """
+        Decorate a loader so that its results are cached in this session cache.
+
+        Parameters
+        ----------
+        func: callable
+            Loader to decorate
+        copy: bool, default True
+            If True, every call returns a copy of the cached result, so callers can modify it freely. Loaders
+            documented as returning shared, read-only objects can set it to False.
+        sources: callable, optional
+            Called with the arguments of the loader (defaults filled in), returns the paths of the files the
+            loader reads. Their size and modification time are part of the cache key, so replacing a source
+            file on disk invalidates the cached result.
+        """
+        if func is None:
+            return functools.partial(self.cached, copy=copy, sources=sources)
+
+        signature = inspect.signature(func)
+        name = _loader_name(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            force_reload = arguments.pop("force_reload", False)
+
+            try:
+                key = (name, _freeze(arguments))
+            except _Unhashable as e:
+                _log.debug(f"Not caching {name}: argument of type {e} is not hashable")
+                return func(*args, **kwargs)
+            if sources is not None:
+                key += (_file_signature(sources(**bound.arguments)),)
+
+            try:
+                with self._key_lock(key):
+                    if not force_reload:
+                        found, value = self._get(key)
+                        if found:
+                            return _copy(value) if copy else value
+
+                    with self._lock:
+                        self.misses += 1
+                    value = func(*args, **kwargs)
+                    self._put(key, value)
+            finally:
+                self._release_key_lock(key)
+
+            return _copy(value) if copy else value
+
+        wrapper.uncached = func
+        return wrapper
+
+
+def _loader_name(func):
+    func = getattr(func, "uncached", func)
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+session_cache = SessionCache()
+
+
+def cached_loader(func=None, *, copy=True, sources=None):
+    """
+    Cache the results of a loader in the process-wide ``session_cache``. See ``SessionCache.cached``.
+    """
+    return session_cache.cached(func, copy=copy, sources=sources)
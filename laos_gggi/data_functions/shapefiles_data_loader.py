@@ -4,9 +4,11 @@ from os.path import exists
 from urllib.request import urlretrieve
 from zipfile import ZipFile
 import geopandas as gpd
+import hashlib
 import numpy as np
 import pandas as pd
 
+from laos_gggi.data_functions.session_cache import cached_loader
 from laos_gggi.data_functions.rivers_data_loader import load_rivers_data
 from laos_gggi.const_vars import (
     WORLD_URL,
@@ -15,8 +17,15 @@ from laos_gggi.const_vars import (
     LAOS_FILENAME,
     COASTLINE_FILENAME,
     COASTLINE_URL,
+    POINT_GRID_SHAPEFILE_RENAME,
 )
-from laos_gggi.statistics import get_distance_to
+from laos_gggi.data_functions.artifact_store import (
+    read_geo_artifact,
+    write_geo_artifact,
+    geo_artifact_exists,
+    select_columns,
+)
+from laos_gggi.statistics import get_distance_to, create_point_grid
 import logging
 
 _log = logging.getLogger(__name__)
@@ -72,6 +81,7 @@ def extract_shapefiles(which: str, output_path="data/shapefiles", force_reload=F
             zObject.extractall(path=here(output_path))
 
 
+@cached_loader
 def load_shapefile(
     which, output_path="data/shapefiles", force_reload=False, repair_ISO_codes=True
 ):
@@ -118,40 +128,125 @@ def load_shapefile(
     return df
 
 
-def create_laos_point_grid():
-    if exists(here("data/laos_points.shp")):
-        laos_points = gpd.read_file(here("data/laos_points.shp"))
-        laos_points = laos_points.rename(
-            columns={
-                "distance_t": "distance_to_river",
-                "distance_1": "distance_to_coastline",
-                "log_distan": "log_distance_to_river",
-                "log_dist_1": "log_distance_to_coastline",
-            }
-        )
-        return laos_points
+PROJECTED_LAYERS = ["rivers", "coastline"]
+
+# Padding, in degrees, of the box of rivers loaded around a study area. In EPSG:3395, a river outside the padded
+# box is at least RIVERS_BBOX_MARGIN * RIVERS_MARGIN_METERS_PER_DEGREE meters from any point of the area.
+RIVERS_BBOX_MARGIN = 5.0
+RIVERS_MARGIN_METERS_PER_DEGREE = 110_574.0
+
+
+def study_area_bbox(shapes, margin=RIVERS_BBOX_MARGIN):
+    """
+    Return the bounds of ``shapes`` in lon-lat coordinates, padded by ``margin`` degrees, as a tuple suitable
+    for the ``bbox`` argument of ``load_projected_layer``.
+    """
+    lon_min, lat_min, lon_max, lat_max = shapes.to_crs("EPSG:4326").total_bounds
+    return (
+        max(float(lon_min) - margin, -180.0),
+        max(float(lat_min) - margin, -90.0),
+        min(float(lon_max) + margin, 180.0),
+        min(float(lat_max) + margin, 90.0),
+    )
+
+
+def _projected_layer_filename(which, crs, query, bbox=None):
+    fname = f"{which}_{crs.replace(':', '').lower()}"
+    if query is not None:
+        fname += "_" + hashlib.md5(query.encode()).hexdigest()[:8]
+    if bbox is not None:
+        key = repr(tuple(map(float, bbox)))
+        fname += "_bbox_" + hashlib.md5(key.encode()).hexdigest()[:8]
+    return fname + ".parquet"
+
+
+@cached_loader(copy=False)
+def load_projected_layer(
+    which,
+    crs="EPSG:3395",
+    query=None,
+    output_path="data/shapefiles/projected",
+    force_reload=False,
+    bbox=None,
+):
+    """
+    Load a distance target layer (rivers or coastline boundaries), already projected to ``crs``.
+
+    Projected layers are cached under the key (which, query, crs, bbox): in memory, in the session cache, and on
+    disk as GeoParquet. Repeated distance computations can then pass the returned frame straight to
+    ``get_distance_to``, which skips reprojection when the CRS already matches.
+
+    Parameters
+    ----------
+    which: str
+        One of "rivers" (the big rivers returned by ``load_rivers_data``) or "coastline" (the boundary of
+        the full-resolution GSHHS shapefile)
+    crs: str, default "EPSG:3395"
+        Target CRS
+    query: str, optional
+        ``DataFrame.query`` expression applied to the layer before projection
+    output_path: str
+        Folder holding the GeoParquet copies of the projected layers
+    force_reload: bool, default False
+        If True, rebuild the layer from the source shapefiles and overwrite the cached copies
+    bbox: tuple of float, optional
+        (lon_min, lat_min, lon_max, lat_max) box, in EPSG:4326. Only the rivers intersecting it are read from the
+        HydroRIVERS shapefile (see ``load_rivers_data``). Use ``study_area_bbox`` to pad the bounds of a region,
+        so that the closest river of every point of the region stays in the layer. Not supported for the
+        coastline, whose closest point can lie far outside the area (e.g. for landlocked countries).
+
+    Returns
+    -------
+    GeoDataFrame
+        The projected layer. The same object is returned on every cache hit, so callers should not
+        modify it in place.
+    """
+    if which.lower() not in PROJECTED_LAYERS:
+        raise ValueError(f"which should be one of {PROJECTED_LAYERS}, got {which}")
+    which = which.lower()
+    if bbox is not None and which != "rivers":
+        raise ValueError("bbox is only supported for the rivers layer")
 
+    output_path = here(output_path)
+    if not exists(output_path):
+        os.makedirs(output_path)
+    fpath = os.path.join(
+        output_path, _projected_layer_filename(which, crs, query, bbox)
+    )
+
+    if exists(fpath) and not force_reload:
+        layer = read_geo_artifact(fpath)
     else:
-        laos = load_shapefile("laos")
-        coastline = load_shapefile("coastline")
-        rivers = load_rivers_data()
+        if which == "rivers":
+            layer = load_rivers_data(bbox=None if bbox is None else tuple(bbox))
+        else:
+            layer = load_shapefile("coastline").boundary.to_frame("geometry")
 
-        # Creating Laos grid
-        lon_min, lat_min, lon_max, lat_max = laos.dissolve().bounds.values.ravel()
-        lon_grid = np.linspace(lon_min, lon_max, 100)
-        lat_grid = np.linspace(lat_min, lat_max, 100)
+        if query is not None:
+            layer = layer.query(query)
 
-        laos_grid = np.column_stack(
-            [x.ravel() for x in np.meshgrid(lon_grid, lat_grid)]
-        )
-        grid = gpd.GeoSeries(gpd.points_from_xy(*laos_grid.T), crs="EPSG:4326")
-        grid = gpd.GeoDataFrame({"geometry": grid})
+        _log.info(f"Projecting {which} layer to {crs}")
+        layer = layer.to_crs(crs)
+        write_geo_artifact(layer, fpath)
+
+    return layer
 
-        laos_points = grid.overlay(laos, how="intersection").geometry
-        laos_points = laos_points.to_frame().assign(
-            lon=lambda x: x.geometry.x, lat=lambda x: x.geometry.y
+
+def create_laos_point_grid(columns=None):
+    fpath = here("data/laos_points.parquet")
+    if geo_artifact_exists(fpath):
+        return read_geo_artifact(
+            fpath, columns=columns, legacy_rename=POINT_GRID_SHAPEFILE_RENAME
         )
 
+    else:
+        laos = load_shapefile("laos")
+        coastline = load_projected_layer("coastline")
+        rivers = load_projected_layer("rivers", bbox=study_area_bbox(laos))
+
+        # Creating Laos grid
+        laos_points = create_point_grid(laos, grid_size=100, iso_col=None)
+
         # Obtain distance with rivers
         Laos_distances_rivers = get_distance_to(
             rivers, points=laos_points, return_columns=["ORD_FLOW", "HYRIV_ID"]
@@ -167,7 +262,7 @@ def create_laos_point_grid():
 
         # Obtain Laos distance with coastlines
         Laos_distances_coastlines = get_distance_to(
-            coastline.boundary, points=laos_points, return_columns=None
+            coastline, points=laos_points, return_columns=None
         ).rename(columns={"distance_to_closest": "distance_to_coastline"})
 
         laos_points = pd.merge(
@@ -190,6 +285,6 @@ def create_laos_point_grid():
             log_distance_to_coastline=lambda x: np.log(x.distance_to_coastline)
         )
 
-        laos_points.to_file(here("data/laos_points.shp"))
+        write_geo_artifact(laos_points, fpath)
 
-        return laos_points
+        return select_columns(laos_points, columns)
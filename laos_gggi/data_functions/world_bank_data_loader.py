@@ -3,6 +3,7 @@ import os
 from os.path import exists
 from pandas_datareader import wb
 import pandas as pd
+from laos_gggi.data_functions.session_cache import cached_loader
 from laos_gggi.const_vars import (
     COUNTRIES_ISO,
     ISO_DICTIONARY,
@@ -15,6 +16,11 @@ import logging
 _log = logging.getLogger(__name__)
 
 
+def _wb_sources(folder_path="data", **kwargs):
+    return [here(os.path.join(folder_path, "world_bank.csv"))]
+
+
+@cached_loader(sources=_wb_sources)
 def load_wb_data(folder_path="data", force_reload=False):
     path_to_wb_data = here(os.path.join(folder_path, "world_bank.csv"))
     if not exists(folder_path):
@@ -1,21 +1,53 @@
 import pandas as pd
 from laos_gggi import load_all_data
+from laos_gggi.statistics import deviation_from_baseline
+from laos_gggi.data_functions.panel import (
+    build_panel,
+    compact_frame,
+    to_legacy_index,
+)
 from statsmodels.tsa.seasonal import STL
 import numpy as np
 
 
-def create_replication_data():
+def create_replication_data(
+    compact=False, float32=False, iso_list=None, region=None, years=None
+):
+    """
+    Build the country-year regression dataset.
+
+    Parameters
+    ----------
+    compact: bool, default False
+        If True, "ISO" is categorical, "year" holds int16 years instead of datetimes, and disaster counts are
+        stored as small integers. See ``compact_frame``.
+    float32: bool, default False
+        If True and ``compact`` is True, the continuous covariates are stored as float32
+    iso_list: list of str, optional
+        Only load these countries
+    region: str or list of str, optional
+        Only load the countries of these EM-DAT regions or subregions
+    years: tuple of int, optional
+        Only return these years, both included. The precipitation baseline and the ocean temperature trend need
+        the full history, so this filter is applied to the result rather than when loading.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per (ISO, year)
+    """
     # Load data
-    data = load_all_data()
+    data = load_all_data(iso_list=iso_list, region=region)
     df_clim = data["df_time_series"][["co2", "Temp", "precip"]].iloc[1:-1]
     emdat_damage_hydro = data["emdat_damage"][
         ["Total_Damage_Adjusted_hydro", "Total_Affected_hydro"]
     ]  # noga
     emdat_damage_clim = data["emdat_damage"]["Total_Damage_Adjusted_clim"]
-    hydro_disasters = data["emdat_events"][["Flood", "Storm"]]
-    climate_disasters = data["emdat_events"][
-        ["Extreme temperature", "Wildfire", "Drought"]
-    ]
+    # A regional subset may have no event of some disaster type, hence no column for it
+    hydro_disasters = data["emdat_events"].reindex(columns=["Flood", "Storm"])
+    climate_disasters = data["emdat_events"].reindex(
+        columns=["Extreme temperature", "Wildfire", "Drought"]
+    )
     disasters = data["emdat_events"]
     development_indicators = data["wb_data"]
     precipitation = data["gpcc"]
@@ -32,30 +64,14 @@ def create_replication_data():
     # Fill NaN values for disasters and emdat_damage
     disasters = disasters.fillna(0)
 
-    # Obtain each country's precipitation deviation from the average for its 30-year base climatology period 1961–1990
-    countries = precipitation.reset_index()["ISO"].unique()
-
-    precip_deviation = pd.DataFrame()
-
-    precip_deviation = pd.DataFrame(columns=countries)
-    for x in countries:
-        precip_deviation[x] = (
-            precipitation.reset_index().pivot(
-                index="year", values="precip", columns="ISO"
-            )[x]
-            - pd.DataFrame(precipitation.unstack(-2).head(30).mean())
-            .loc["precip"]
-            .loc[x]
-            .values
-        )
-
+    # Obtain each country's precipitation deviation from the average of a 30-year base climatology period.
+    # GPCC data starts in 1981, so the period is 1981-2010 (the first 30 years of data) rather than 1961–1990
     precip_deviation = (
-        precip_deviation.stack()
-        .reset_index()
-        .rename(columns={"level_1": "ISO", 0: "precip_deviation"})
-        .set_index(["ISO", "year"])
+        deviation_from_baseline(precipitation["precip"], baseline=(1981, 2010))
+        .rename("precip_deviation")
+        .to_frame()
+        .sort_index()
     )
-    precip_deviation = precip_deviation.sort_index()
 
     # Obtain the sea temperature deviation from the trend
     stl_ocean_temp = STL(pd.DataFrame(df_clim["Temp"].dropna()), period=3)
@@ -74,54 +90,25 @@ def create_replication_data():
         (development_indicators["ln_gdp_pc"]) * (development_indicators["ln_gdp_pc"])
     )
 
-    # Merging everything into one df
-    df = pd.merge(
-        disasters, development_indicators, right_index=True, left_index=True, how="left"
-    )
-    df = df.reset_index().rename(columns={"Start_Year": "year"}).set_index("year")
-
-    df = pd.merge(
-        df,
-        pd.DataFrame(dev_from_trend_ocean_temp).rename(
-            columns={0: "dev_from_trend_ocean_temp"}
-        ),
-        right_index=True,
-        left_index=True,
-        how="left",
-    )
-
-    df = pd.merge(df, (df_clim["co2"]), right_index=True, left_index=True, how="left")
-
-    df = pd.merge(
-        df.reset_index().set_index(["ISO", "year"]),
-        precip_deviation,
-        right_index=True,
-        left_index=True,
-        how="left",
-    )
-
-    # df = pd.merge(
-    #     df, data["surface_temp"], right_index=True, left_index=True, how="left"
-    # )
-    df = pd.merge(
-        df,
-        emdat_damage_hydro.reset_index()
-        .rename(columns={"Start_Year": "year"})
-        .set_index(["ISO", "year"]),
-        right_index=True,
-        left_index=True,
-        how="left",
-    )
-
-    df = pd.merge(
-        df,
-        emdat_damage_clim.reset_index()
-        .rename(columns={"Start_Year": "year"})
-        .set_index(["ISO", "year"]),
-        right_index=True,
-        left_index=True,
-        how="left",
+    # Assembling everything into one df, on the rows of the disasters data
+    df = build_panel(
+        [
+            disasters,
+            development_indicators,
+            precip_deviation,
+            emdat_damage_hydro,
+            emdat_damage_clim,
+        ],
+        year_sources=[
+            dev_from_trend_ocean_temp.rename("dev_from_trend_ocean_temp"),
+            df_clim["co2"],
+        ],
+        index=disasters.index,
     )
+    if compact:
+        df = compact_frame(df, float32=float32)
+    else:
+        df = to_legacy_index(df, time_name="year")
 
     df = df.reset_index()
     cols_to_use = [
@@ -142,10 +129,16 @@ def create_replication_data():
     ]
     df = df[cols_to_use]
     df = df.dropna()
+    if years is not None:
+        year = df["year"] if compact else df["year"].dt.year
+        df = df.loc[year.between(*years)]
     df["population"] = df["population"] / 1e6
 
     # Creating the time trend
-    df["time_period"] = (df["year"].dt.year - 1980) / 100
+    year = df["year"] if compact else df["year"].dt.year
+    df["time_period"] = ((year - 1980) / 100).astype(
+        "float32" if compact and float32 else "float64"
+    )
 
     # Adjust data types
     df["ISO"] = df["ISO"]
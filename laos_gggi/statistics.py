@@ -1,12 +1,17 @@
 from statsmodels.tsa.stattools import adfuller
-from joblib import Parallel, delayed
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
 import pandas as pd
 from tqdm.notebook import tqdm
 import numpy as np
 import geopandas as gpd
+import shapely
+from shapely import STRtree
 import arviz as az
 import pymc as pm
 
+MIN_POINTS_PER_WORKER = 10_000
+
 
 # Descriptive stats function
 def descriptive_stats_function(df, varlist):
@@ -103,74 +108,585 @@ def ADF_test_summary(df, maxlag=None, autolag="BIC", missing="error"):
                     print(line)
 
 
-def get_distance_to_rivers(rivers, points, crs="EPSG:3395"):
-    ret = pd.DataFrame(
-        index=points.index, columns=["closest_river", "ORD_FLOW", "HYRIV_ID"]
+def deviation_from_baseline(data, baseline=(1961, 1990), group="ISO", time="year"):
+    """
+    Compute the deviation of panel variables from each group's mean over a baseline period.
+
+    The baseline means of all groups are computed in a single grouped transform, and subtracted from every
+    observation of the group. Groups with no observation in the baseline period get NaN.
+
+    Parameters
+    ----------
+    data: pd.Series or pd.DataFrame
+        Panel variable(s), with a MultiIndex containing the ``group`` and ``time`` levels
+    baseline: tuple of int, default (1961, 1990)
+        First and last year of the baseline period, both included
+    group: str, default "ISO"
+        Index level identifying the groups (e.g. countries)
+    time: str, default "year"
+        Index level holding the time of each observation, either as years or as datetimes
+
+    Returns
+    -------
+    pd.Series or pd.DataFrame
+        Deviations, with the same index and columns as ``data``
+    """
+    years = data.index.get_level_values(time)
+    if isinstance(years, pd.DatetimeIndex):
+        years = years.year
+
+    start, end = baseline
+    in_baseline = np.asarray((years >= start) & (years <= end))
+    if isinstance(data, pd.DataFrame):
+        in_baseline = np.broadcast_to(in_baseline[:, None], data.shape)
+
+    baseline_mean = data.where(in_baseline).groupby(level=group).transform("mean")
+
+    return data - baseline_mean
+
+
+class NearestFeatureIndex:
+    """
+    Spatial index over a layer of target geometries, used to answer bulk nearest-feature queries.
+
+    The target layer is projected once and loaded into a shapely STRtree, so each query costs roughly
+    O(log(n_features)) per point instead of a full scan over the layer.
+
+    Parameters
+    ----------
+    gdf: GeoDataFrame or GeoSeries
+        Target geometries (rivers, coastline boundaries, ...)
+    return_columns: list of str, optional
+        Columns of ``gdf`` to report for the closest feature of each point
+    crs: str, default "EPSG:3395"
+        Projected CRS in which distances are computed
+    """
+
+    def __init__(self, gdf, return_columns=None, crs="EPSG:3395"):
+        if return_columns is None:
+            return_columns = []
+
+        gdf_km = gdf if gdf.crs == crs else gdf.to_crs(crs)
+
+        self.crs = crs
+        self.return_columns = list(return_columns)
+        self.geometries = np.asarray(gdf_km.geometry.values)
+        self.attributes = {col: gdf_km[col].to_numpy() for col in self.return_columns}
+        self.tree = STRtree(self.geometries)
+
+    def query(self, geometries, max_distance=None):
+        """
+        Find the closest target feature for every geometry in ``geometries``.
+
+        Parameters
+        ----------
+        geometries: array of shapely geometries
+            Query geometries, already in ``self.crs``
+        max_distance: float or np.ndarray, optional
+            Search radius, in units of ``self.crs``, either shared by every geometry or one per geometry. Points
+            with no feature inside the radius get NaN.
+
+        Returns
+        -------
+        distances: np.ndarray
+            Distance from each query geometry to its closest feature
+        feature_idx: np.ndarray
+            Positional index of the closest feature in the target layer, -1 if none was found
+        """
+        n = len(geometries)
+        if np.ndim(max_distance) == 0:
+            (input_idx, tree_idx), dists = self.tree.query_nearest(
+                geometries,
+                max_distance=max_distance,
+                return_distance=True,
+                all_matches=True,
+            )
+        else:
+            # query_nearest only takes one radius; with one radius per point, the candidates within each radius
+            # are found first and the closest one is kept
+            input_idx, tree_idx = self.tree.query(
+                geometries, predicate="dwithin", distance=max_distance
+            )
+            dists = shapely.distance(geometries[input_idx], self.geometries[tree_idx])
+
+        # Ties are broken in favor of the first feature in the layer, like an argmin over the full scan
+        order = np.lexsort((tree_idx, dists, input_idx))
+        input_idx, tree_idx, dists = input_idx[order], tree_idx[order], dists[order]
+        input_idx, first = np.unique(input_idx, return_index=True)
+
+        distances = np.full(n, np.nan)
+        feature_idx = np.full(n, -1, dtype="int64")
+        distances[input_idx] = dists[first]
+        feature_idx[input_idx] = tree_idx[first]
+
+        return distances, feature_idx
+
+    def nearest(self, points, max_distance=None, n_cores=1, chunk_size=None, desc=None):
+        """
+        Compute the distance from every point to its closest target feature.
+
+        Parameters
+        ----------
+        points: GeoDataFrame
+            Points to query. They are projected to ``self.crs`` if needed.
+        max_distance: float, optional
+            Search radius, in units of ``self.crs``
+        n_cores: int, default 1
+            Number of worker processes. -1 uses every available core. Small point sets are always queried
+            in the calling process, since starting workers would cost more than the query itself.
+        chunk_size: int, optional
+            Number of points per block. Defaults to splitting the points into about four blocks per worker.
+        desc: str, optional
+            Description for the progress bar
+
+        Returns
+        -------
+        pd.DataFrame
+            Frame indexed like ``points``, with a ``distance_to_closest`` column plus one column per
+            ``return_columns`` entry.
+        """
+        points_km = points if points.crs == self.crs else points.to_crs(self.crs)
+        geometries = np.asarray(points_km.geometry.values)
+        n = len(geometries)
+
+        if n_cores < 0:
+            n_cores = os.cpu_count() or 1
+        n_cores = max(1, min(n_cores, n // MIN_POINTS_PER_WORKER))
+
+        if chunk_size is None:
+            chunk_size = max(MIN_POINTS_PER_WORKER, -(-n // (4 * n_cores)))
+        starts = range(0, n, chunk_size)
+
+        distances = np.full(n, np.nan)
+        feature_idx = np.full(n, -1, dtype="int64")
+
+        if n_cores == 1:
+            for start in tqdm(starts, desc=desc):
+                stop = start + chunk_size
+                distances[start:stop], feature_idx[start:stop] = self.query(
+                    geometries[start:stop], max_distance=max_distance
+                )
+        else:
+            # Workers rebuild the tree once from WKB, then only receive point blocks and send back
+            # (distance, feature position) pairs. Attributes are looked up here.
+            with ProcessPoolExecutor(
+                n_cores,
+                initializer=_init_nearest_worker,
+                initargs=(shapely.to_wkb(self.geometries), self.crs),
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        _query_nearest_block,
+                        start,
+                        shapely.to_wkb(geometries[start : start + chunk_size]),
+                        max_distance,
+                    )
+                    for start in starts
+                ]
+                for future in tqdm(
+                    as_completed(futures), total=len(futures), desc=desc
+                ):
+                    start, block_distances, block_idx = future.result()
+                    stop = start + len(block_distances)
+                    distances[start:stop] = block_distances
+                    feature_idx[start:stop] = block_idx
+
+        return self.make_frame(distances, feature_idx, points.index)
+
+    @classmethod
+    def from_wkb(cls, wkb, crs="EPSG:3395"):
+        """
+        Rebuild an index (without attribute columns) from WKB-encoded target geometries, already in ``crs``.
+        """
+        geometries = gpd.GeoSeries(shapely.from_wkb(wkb), crs=crs)
+        return cls(geometries, crs=crs)
+
+    def make_frame(self, distances, feature_idx, index):
+        """
+        Turn the output of ``query`` into the frame returned by ``nearest``.
+
+        Parameters
+        ----------
+        distances: np.ndarray
+            Distances returned by ``query``
+        feature_idx: np.ndarray
+            Feature positions returned by ``query``
+        index: pd.Index
+            Index of the queried points
+
+        Returns
+        -------
+        pd.DataFrame
+            Frame indexed by ``index``, with a ``distance_to_closest`` column plus one column per
+            ``return_columns`` entry. Points with no feature found get NaN attributes.
+        """
+        result = {"distance_to_closest": distances}
+        found = feature_idx >= 0
+
+        for col, values in self.attributes.items():
+            if found.all():
+                result[col] = values[feature_idx]
+            else:
+                result[col] = (
+                    pd.Series(values[feature_idx[found]], index=np.flatnonzero(found))
+                    .reindex(np.arange(len(feature_idx)))
+                    .to_numpy()
+                )
+
+        return pd.DataFrame(result, index=index)
+
+
+_WORKER_INDEX = None
+
+
+def _init_nearest_worker(wkb, crs):
+    global _WORKER_INDEX
+    _WORKER_INDEX = NearestFeatureIndex.from_wkb(wkb, crs=crs)
+
+
+def _query_nearest_block(start, wkb, max_distance):
+    distances, feature_idx = _WORKER_INDEX.query(
+        shapely.from_wkb(wkb), max_distance=max_distance
     )
-    rivers_km = rivers.copy().to_crs(crs)
-    points_km = points.copy().to_crs(crs)
-    for idx, row in tqdm(points_km.iterrows(), total=points.shape[0]):
-        series = rivers_km.distance(row.geometry)
-        ret.loc[idx, "closest_river"] = series.min()
+    return start, distances, feature_idx
+
+
+RASTER_BLOCK_SIZE = 100_000
+
+
+class DistanceRaster:
+    """
+    Distance to the closest feature of a layer, precomputed on a regular grid of nodes and interpolated
+    bilinearly.
+
+    Node distances are exact (see ``NearestFeatureIndex``). Between nodes, the distance to a set of features is
+    1-Lipschitz, and bilinear weights are non-negative and sum to one, so the interpolated distance at a point
+    p differs from the exact one by at most sum_k w_k |p - n_k| over the four surrounding nodes n_k. That sum
+    is largest at the center of a cell, which bounds the error by ``resolution / sqrt(2)`` (``error_bound``).
+
+    Only distances are stored. Attributes of the closest feature cannot be interpolated, so ``lookup`` finds them
+    exactly in the layer, using the interpolated distance to bound the search.
+
+    Parameters
+    ----------
+    distances: np.ndarray
+        Distance from every node to its closest feature, with shape (n_y, n_x)
+    x0: float
+        x coordinate of the first column of nodes, in units of ``crs``
+    y0: float
+        y coordinate of the first row of nodes
+    resolution: float
+        Spacing between nodes, in units of ``crs``
+    crs: str, default "EPSG:3395"
+        Projected CRS of the nodes
+    """
+
+    def __init__(self, distances, x0, y0, resolution, crs="EPSG:3395"):
+        self.distances = np.asarray(distances, dtype="float64")
+        self.x0 = float(x0)
+        self.y0 = float(y0)
+        self.resolution = float(resolution)
+        self.crs = crs
+
+    @property
+    def error_bound(self):
+        return self.resolution / np.sqrt(2)
+
+    @property
+    def bounds(self):
+        n_y, n_x = self.distances.shape
+        return (
+            self.x0,
+            self.y0,
+            self.x0 + (n_x - 1) * self.resolution,
+            self.y0 + (n_y - 1) * self.resolution,
+        )
 
-        index = series[series == series.min()].index[0]
-        ret.loc[idx, "ORD_FLOW"] = rivers_km.loc[index]["ORD_FLOW"]
-        ret.loc[idx, "HYRIV_ID"] = rivers_km.loc[index]["HYRIV_ID"]
+    @classmethod
+    def from_layer(cls, gdf, bounds, resolution, crs="EPSG:3395", desc=None):
+        """
+        Compute the distance raster of a layer over ``bounds``.
+
+        Parameters
+        ----------
+        gdf: GeoDataFrame or GeoSeries
+            Target geometries (rivers, coastline boundaries, ...)
+        bounds: tuple of float
+            (min x, min y, max x, max y) to cover, in units of ``crs``. Nodes extend to the first multiple of
+            ``resolution`` past the maximum.
+        resolution: float
+            Spacing between nodes, in units of ``crs``
+        crs: str, default "EPSG:3395"
+            Projected CRS in which distances are computed
+        desc: str, optional
+            Description for the progress bar
+
+        Returns
+        -------
+        DistanceRaster
+        """
+        index = NearestFeatureIndex(gdf, crs=crs)
+
+        x_min, y_min, x_max, y_max = bounds
+        x = x_min + resolution * np.arange(
+            int(np.ceil((x_max - x_min) / resolution)) + 1
+        )
+        y = y_min + resolution * np.arange(
+            int(np.ceil((y_max - y_min) / resolution)) + 1
+        )
 
-    ret["ORD_FLOW"] = ret["ORD_FLOW"].astype("int")
-    ret["closest_river"] = ret["closest_river"].astype("float")
-    return ret
+        distances = np.empty((len(y), len(x)))
+
+        # Nodes are queried a block of rows at a time, so only one block of Point geometries exists at once
+        n_rows = max(1, RASTER_BLOCK_SIZE // len(x))
+        for start in tqdm(range(0, len(y), n_rows), desc=desc):
+            rows = slice(start, start + n_rows)
+            xx, yy = np.meshgrid(x, y[rows])
+            block_distances, _ = index.query(shapely.points(xx, yy).ravel())
+            distances[rows] = block_distances.reshape(xx.shape)
+
+        return cls(distances, x[0], y[0], resolution, crs=crs)
+
+    def interpolate(self, x, y):
+        """
+        Interpolate the distance to the closest feature at coordinates ``x``, ``y`` (in ``self.crs``).
+
+        Returns
+        -------
+        np.ndarray
+            Interpolated distances. Points outside the raster get NaN.
+        """
+        n_y, n_x = self.distances.shape
+        fx = (np.asarray(x, dtype="float64") - self.x0) / self.resolution
+        fy = (np.asarray(y, dtype="float64") - self.y0) / self.resolution
+        outside = ~((fx >= 0) & (fx <= n_x - 1) & (fy >= 0) & (fy <= n_y - 1))
+
+        i = np.clip(np.floor(np.nan_to_num(fx)), 0, max(n_x - 2, 0)).astype("int64")
+        j = np.clip(np.floor(np.nan_to_num(fy)), 0, max(n_y - 2, 0)).astype("int64")
+        tx, ty = fx - i, fy - j
+        i1, j1 = np.minimum(i + 1, n_x - 1), np.minimum(j + 1, n_y - 1)
+
+        d = self.distances
+        result = (1 - ty) * ((1 - tx) * d[j, i] + tx * d[j, i1]) + ty * (
+            (1 - tx) * d[j1, i] + tx * d[j1, i1]
+        )
+        result[outside] = np.nan
+
+        return result
+
+    def lookup(self, points, index=None):
+        """
+        Look up the distance from every point to its closest feature.
+
+        Parameters
+        ----------
+        points: GeoDataFrame or GeoSeries
+            Points to query. They are projected to ``self.crs`` if needed.
+        index: NearestFeatureIndex, optional
+            Index over the layer the raster was computed from. If given, the closest feature of every point is
+            found exactly in ``index``, searching only within the interpolated distance plus ``error_bound``.
+            Distances and the ``return_columns`` of the index are then exact.
+
+        Returns
+        -------
+        pd.DataFrame
+            Frame indexed like ``points``, with a ``distance_to_closest`` column, plus one column per
+            ``return_columns`` entry of ``index``. Without ``index``, points outside the raster get NaN.
+        """
+        geometry = points.geometry if isinstance(points, gpd.GeoDataFrame) else points
+        if geometry.crs != self.crs:
+            geometry = geometry.to_crs(self.crs)
+        geometries = np.asarray(geometry.values)
+        distances = self.interpolate(
+            shapely.get_x(geometries), shapely.get_y(geometries)
+        )
 
+        if index is None:
+            return pd.DataFrame({"distance_to_closest": distances}, index=points.index)
 
-def get_distance_to(
-    gdf, points, return_columns=None, crs="EPSG:3395", n_cores=-1, name=None
-):
-    if return_columns is None:
-        return_columns = []
+        distances, feature_idx = index.query(
+            geometries, max_distance=distances + self.error_bound
+        )
+
+        # Points outside the raster, and any point whose radius was cut short by rounding, are searched in full
+        missing = feature_idx < 0
+        if missing.any():
+            distances[missing], feature_idx[missing] = index.query(geometries[missing])
+
+        return index.make_frame(distances, feature_idx, points.index)
 
-    gdf_km = gdf.copy().to_crs(crs)
-    points_km = points.copy().to_crs(crs)
 
-    def get_closest(idx, row, gdf_km, return_columns):
-        series = gdf_km.distance(row.geometry)
-        index = series[series == series.min()].index[0]
+def get_distance_to_rivers(rivers, points, crs="EPSG:3395"):
+    ret = (
+        NearestFeatureIndex(rivers, return_columns=["ORD_FLOW", "HYRIV_ID"], crs=crs)
+        .nearest(points)
+        .rename(columns={"distance_to_closest": "closest_river"})
+    )
 
-        ret_vals = (series.min(),)
-        for col in return_columns:
-            ret_vals += (gdf_km.loc[index][col],)
+    ret["ORD_FLOW"] = ret["ORD_FLOW"].astype("int")
+    ret["closest_river"] = ret["closest_river"].astype("float")
+    return ret[["closest_river", "ORD_FLOW", "HYRIV_ID"]]
 
-        return ret_vals
 
+def get_distance_to(
+    gdf,
+    points,
+    return_columns=None,
+    crs="EPSG:3395",
+    n_cores=-1,
+    name=None,
+    max_distance=None,
+):
     if name is not None:
         desc = f"Calculating distances to {name}"
     else:
         desc = None
 
-    with Parallel(n_cores, require="sharedmem") as pool:
-        results = pool(
-            delayed(get_closest)(idx, row, gdf_km, return_columns)
-            for idx, row in tqdm(points_km.iterrows(), total=points.shape[0], desc=desc)
-        )
-    return pd.DataFrame(
-        results, columns=["distance_to_closest"] + return_columns, index=points.index
+    index = NearestFeatureIndex(gdf, return_columns=return_columns, crs=crs)
+    return index.nearest(points, max_distance=max_distance, n_cores=n_cores, desc=desc)
+
+
+def _axis_slice(axis, low, high):
+    return slice(
+        np.searchsorted(axis, low, side="left"),
+        np.searchsorted(axis, high, side="right"),
     )
 
 
-def create_grid_from_shape(shapefile, rivers, coastline, grid_size=100):
-    long_min, lat_min, long_max, lat_max = shapefile.dissolve().bounds.values.ravel()
-    long_grid = np.linspace(long_min, long_max, grid_size)
+def dissolve_regions(shapefile, iso_col="ISO_A3"):
+    """
+    Dissolve shapes by country and prepare them for repeated containment tests.
+
+    Parameters
+    ----------
+    shapefile: GeoDataFrame
+        Shapes to dissolve, in lon-lat coordinates
+    iso_col: str, default "ISO_A3"
+        Column of ``shapefile`` holding country codes. If it is missing, the shapes are dissolved into one region.
+
+    Returns
+    -------
+    GeoSeries
+        One prepared geometry per country, indexed by country code (sorted), or a single geometry indexed by None
+    """
+    if iso_col in shapefile.columns:
+        regions = shapefile.dissolve(iso_col).geometry
+    else:
+        regions = gpd.GeoSeries(
+            [shapefile.union_all()], index=[None], crs=shapefile.crs
+        )
+    shapely.prepare(regions.values)
+
+    return regions
+
+
+def points_in_regions(regions, lon_grid, lat_grid):
+    """
+    Find the points of a lon-lat grid that fall on a set of regions.
+
+    For each region, only the grid points inside its bounding box are tested, as plain coordinate arrays. Points
+    on a boundary count as inside. A point on a shared border is assigned to the first region.
+
+    Parameters
+    ----------
+    regions: GeoSeries
+        Output of ``dissolve_regions``
+    lon_grid: np.ndarray
+        Sorted longitudes of the grid columns
+    lat_grid: np.ndarray
+        Sorted latitudes of the grid rows
+
+    Returns
+    -------
+    lat_idx: np.ndarray
+        Row of each point found, in grid order (latitude first)
+    lon_idx: np.ndarray
+        Column of each point found
+    iso: np.ndarray
+        Index label of the region holding each point
+    """
+    shape = (len(lat_grid), len(lon_grid))
+    found = np.zeros(shape, dtype=bool)
+    iso = np.full(shape, None, dtype=object)
+
+    for code, geometry in regions.items():
+        if geometry is None or geometry.is_empty:
+            continue
+        minx, miny, maxx, maxy = geometry.bounds
+        rows, cols = (
+            _axis_slice(lat_grid, miny, maxy),
+            _axis_slice(lon_grid, minx, maxx),
+        )
+
+        lon, lat = np.meshgrid(lon_grid[cols], lat_grid[rows])
+        inside = shapely.intersects_xy(geometry, lon, lat) & ~found[rows, cols]
+        found[rows, cols] |= inside
+        iso[rows, cols][inside] = code
+
+    lat_idx, lon_idx = np.nonzero(found)
+    return lat_idx, lon_idx, iso[lat_idx, lon_idx]
+
+
+def grid_points_frame(lon, lat, iso=None):
+    """
+    Build a GeoDataFrame of lon-lat points, with columns "geometry", "lon", "lat", and "ISO" if ``iso`` is given.
+    """
+    points = gpd.GeoDataFrame(
+        {"lon": lon, "lat": lat},
+        geometry=gpd.points_from_xy(lon, lat),
+        crs="EPSG:4326",
+    )[["geometry", "lon", "lat"]]
+    if iso is not None:
+        # A string dtype keeps the column typed in Parquet even when no point was found
+        points["ISO"] = pd.array(iso, dtype="str")
+
+    return points
+
+
+def create_point_grid(shapefile, grid_size=100, iso_col="ISO_A3"):
+    """
+    Create a regular lon-lat grid over the bounds of a shapefile, keeping the points that fall on its shapes.
+
+    The shapes are dissolved by country and prepared once, then tested against coordinate arrays (see
+    ``points_in_regions``). Point geometries are only created for the points that are kept. Points on a
+    boundary are kept, like a polygon overlay would.
+
+    Parameters
+    ----------
+    shapefile: GeoDataFrame
+        Shapes covered by the grid, in lon-lat coordinates
+    grid_size: int, default 100
+        Number of grid points along each axis, spread evenly between the bounds of ``shapefile``
+    iso_col: str, default "ISO_A3"
+        Column of ``shapefile`` holding country codes. If it is missing, the shapes are treated as one region.
+
+    Returns
+    -------
+    GeoDataFrame
+        One row per kept point, in grid order (latitude first), with columns "geometry", "lon", "lat", and "ISO"
+        if ``iso_col`` is in ``shapefile``. A point on a shared border is assigned to the first country in
+        alphabetical order.
+    """
+    lon_min, lat_min, lon_max, lat_max = shapefile.total_bounds
+    lon_grid = np.linspace(lon_min, lon_max, grid_size)
     lat_grid = np.linspace(lat_min, lat_max, grid_size)
 
-    grid = np.column_stack([x.ravel() for x in np.meshgrid(long_grid, lat_grid)])
-    grid = gpd.GeoSeries(gpd.points_from_xy(*grid.T), crs="EPSG:4326")
-    grid = gpd.GeoDataFrame({"geometry": grid})
+    regions = dissolve_regions(shapefile, iso_col=iso_col)
+    lat_idx, lon_idx, iso = points_in_regions(regions, lon_grid, lat_grid)
 
-    point_overlay = grid.overlay(shapefile, how="intersection")
-    points = point_overlay.geometry
-    points = points.to_frame().assign(
-        long=lambda x: x.geometry.x, lat=lambda x: x.geometry.y
+    return grid_points_frame(
+        lon_grid[lon_idx],
+        lat_grid[lat_idx],
+        iso=iso if iso_col in shapefile.columns else None,
     )
 
+
+def create_grid_from_shape(shapefile, rivers, coastline, grid_size=100):
+    points = create_point_grid(shapefile, grid_size=grid_size).rename(
+        columns={"lon": "long"}
+    )
+    iso = points.pop("ISO") if "ISO" in points.columns else "LAO"
+
     # Obtain distance with rivers
     distances_to_rivers = get_distance_to(
         rivers, points=points, return_columns=["ORD_FLOW", "HYRIV_ID"]
@@ -195,10 +711,7 @@ def create_grid_from_shape(shapefile, rivers, coastline, grid_size=100):
         log_distance_to_coastline=lambda x: np.log(x.distance_to_coastline),
     )
 
-    if "ISO_A3" in point_overlay.columns:
-        points["ISO"] = point_overlay.ISO_A3
-    else:
-        points["ISO"] = "LAO"
+    points["ISO"] = iso
 
     return points
 